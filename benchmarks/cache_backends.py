@@ -0,0 +1,124 @@
+"""
+Сравнение бэкендов кэша: LocMemCache, FileBasedCache и core.cache.SQLiteCache.
+
+Запуск из корня репозитория:
+
+    python benchmarks/cache_backends.py --ops 20000 --processes 4
+
+Для каждого бэкенда меряется скорость get (попадание и промах), set
+и incr в одном процессе, а затем incr из нескольких процессов сразу:
+счетчик версии должен вырасти ровно на число вызовов. LocMemCache
+у каждого процесса свой, поэтому общий счетчик у него не растет.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yatube')
+)
+
+from django.conf import settings  # noqa: E402
+
+settings.configure()
+
+from django.core.cache.backends.filebased import FileBasedCache  # noqa: E402
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+from core.cache import SQLiteCache  # noqa: E402
+
+OPTIONS = {'MAX_ENTRIES': 1000000}
+
+
+def make_backends(directory):
+    return {
+        'locmem': lambda: LocMemCache('bench', {'OPTIONS': OPTIONS}),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'filebased'), {'OPTIONS': OPTIONS},
+        ),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), {'OPTIONS': OPTIONS},
+        ),
+    }
+
+
+def timed(function, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        function(i)
+    return ops / (time.perf_counter() - start)
+
+
+def single_process(cache, ops, value):
+    keys = [f'page:{i}' for i in range(ops)]
+    cache.set('version', 1)
+    return {
+        'set': timed(lambda i: cache.set(keys[i], value), ops),
+        'get hit': timed(lambda i: cache.get(keys[i]), ops),
+        'get miss': timed(lambda i: cache.get(f'missing:{i}'), ops),
+        'incr': timed(lambda i: cache.incr('version'), ops),
+    }
+
+
+def incr_worker(factory, ops):
+    cache = factory()
+    for _ in range(ops):
+        cache.incr('shared-version')
+
+
+def multi_process(factory, processes, ops):
+    cache = factory()
+    cache.set('shared-version', 0)
+    workers = [
+        multiprocessing.Process(target=incr_worker, args=(factory, ops))
+        for _ in range(processes)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return processes * ops / elapsed, cache.get('shared-version')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--ops', type=int, default=10000)
+    parser.add_argument('--value-size', type=int, default=4096)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    # страница средней величины
+    value = 'x' * args.value_size
+    directory = tempfile.mkdtemp()
+    try:
+        backends = make_backends(directory)
+        print(f'{"backend":<10} {"operation":<12} {"ops/s":>12}')
+        for name, factory in backends.items():
+            for operation, rate in single_process(
+                factory(), args.ops, value,
+            ).items():
+                print(f'{name:<10} {operation:<12} {rate:>12,.0f}')
+
+        print()
+        print(f'incr из {args.processes} процессов по {args.ops} раз')
+        print(f'{"backend":<10} {"ops/s":>12} {"итог":>10} {"ожидалось":>10}')
+        expected = args.processes * args.ops
+        # при fork фабрики переходят в дочерние процессы как есть
+        multiprocessing.set_start_method('fork')
+        for name in ('locmem', 'sqlite'):
+            rate, total = multi_process(
+                backends[name], args.processes, args.ops,
+            )
+            print(f'{name:<10} {rate:>12,.0f} {total:>10} {expected:>10}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Пиковая память и время обработки загруженной картинки.
+
+Запуск из корня репозитория:
+
+    python benchmarks/image_ingestion.py --width 6000 --height 4000
+
+Сравниваются posts.images.ingest() (декодирование JPEG в режиме draft)
+и «наивная» обработка, которая декодирует снимок целиком и только потом
+уменьшает. Каждый вариант запускается в новом процессе, пиковый RSS
+(VmHWM, только Linux) считается от уровня перед чтением исходника.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yatube')
+)
+
+from django.conf import settings  # noqa: E402
+
+settings.configure(IMAGE_MAX_SIZE=2048, IMAGE_QUALITY=85)
+
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from PIL import Image, ImageOps  # noqa: E402
+
+from posts.images import ingest  # noqa: E402
+
+
+def make_photo(width, height):
+    """Снимок с шумом (плохо сжимается, как настоящее фото) и EXIF."""
+    noise = Image.effect_noise((width, height), 64)
+    photo = Image.merge('RGB', (noise, noise.rotate(180), noise))
+    exif = Image.Exif()
+    exif[0x0110] = 'Camera'
+    buffer = BytesIO()
+    photo.save(buffer, 'JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def naive(upload):
+    image = ImageOps.exif_transpose(Image.open(upload))
+    image.load()
+    image.thumbnail((settings.IMAGE_MAX_SIZE,) * 2, Image.LANCZOS)
+    output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    image.convert('RGB').save(output, 'JPEG', quality=85, progressive=True)
+    return output
+
+
+def draft(upload):
+    return ingest(upload)
+
+
+def reset_peak_rss():
+    # ru_maxrss переживает fork и exec, поэтому пик сбрасывается явно
+    # (Linux 4.0+)
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def peak_rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+
+def run(name, path, repeat, queue):
+    function = {'naive': naive, 'draft': draft}[name]
+    # в пик входит и сам загруженный файл, как при настоящей загрузке
+    reset_peak_rss()
+    baseline = peak_rss_kb()
+    with open(path, 'rb') as source:
+        data = source.read()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        output = function(SimpleUploadedFile('photo.jpg', data))
+        output.seek(0, os.SEEK_END)
+        size = output.tell()
+    elapsed = (time.perf_counter() - start) / repeat
+    queue.put((elapsed, peak_rss_kb() - baseline, size))
+
+
+def compare(path, repeat):
+    print(
+        f'{"mode":<8} {"мс/картинка":>12} '
+        f'{"пик RSS, Мб":>12} {"итог, Кб":>10}'
+    )
+    context = multiprocessing.get_context('spawn')
+    for name in ('naive', 'draft'):
+        queue = context.Queue()
+        process = context.Process(
+            target=run, args=(name, path, repeat, queue),
+        )
+        process.start()
+        elapsed, rss, size = queue.get()
+        process.join()
+        print(
+            f'{name:<8} {elapsed * 1000:>12,.0f} '
+            f'{rss / 1024:>12,.1f} {size / 1024:>10,.0f}'
+        )
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--width', type=int, default=6000)
+    parser.add_argument('--height', type=int, default=4000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_photo(args.width, args.height)
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as source:
+        source.write(data)
+        source.flush()
+        print(
+            f'исходник {args.width}x{args.height}, '
+            f'{len(data) / 1024 / 1024:.1f} Мб'
+        )
+        compare(source.name, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+"""
+Нагрузочный тест yatube.wsgi.application на заполненной базе.
+
+Запуск из корня репозитория:
+
+    python benchmarks/load_test.py --users 2000 --posts 50000 \\
+        --threads 8 --duration 60 --output load.json
+
+Сначала отдельный файл SQLite заполняется командой seed_yatube:
+пользователи, группы, посты, подписки и комментарии с популярностью
+по степенному закону. С --reuse уже заполненная база используется
+повторно.
+
+Затем потоки вызывают WSGI-приложение напрямую, без HTTP-сервера,
+по сценариям: аноним листает главную и группы, пользователь читает
+ленту подписок, открываются профили и посты, пишутся новые посты.
+Задержки p50/p95/p99 (мс) и пропускная способность (запросов в секунду)
+по именам URL печатаются и сохраняются в JSON; с --compare результаты
+сравниваются с прошлым прогоном, например на другом коммите.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from io import BytesIO
+from itertools import accumulate
+from urllib.parse import urlencode
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yatube')
+)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import (  # noqa: E402
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY,
+)
+from django.contrib.sessions.backends.db import SessionStore  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.middleware.csrf import _get_new_csrf_token  # noqa: E402
+from django.urls import resolve  # noqa: E402
+
+from posts.models import Comment, Follow, Group, Post, User  # noqa: E402
+from yatube.wsgi import application  # noqa: E402
+
+# показатель степенного закона: чем больше, тем сильнее перекос
+ZIPF_EXPONENT = 1.1
+
+# сценарии и их доли в общем потоке
+MIX = {
+    'anonymous_browse': 40,
+    'follow_feed': 25,
+    'profile': 15,
+    'post_detail': 15,
+    'posting': 5,
+}
+
+WORDS = (
+    'кот собака дом лето зима город река лес море книга музыка кино '
+    'работа отпуск утро вечер дорога поезд друг семья сад кофе'
+).split()
+
+
+def zipf_weights(count):
+    """Накопленные веса Zipf для random.choices(cum_weights=...)."""
+    return list(accumulate(
+        1 / (rank ** ZIPF_EXPONENT) for rank in range(1, count + 1)
+    ))
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, words)))
+
+
+class Client:
+    """
+    Посетитель сайта: собирает WSGI environ и вызывает приложение.
+    У вошедшего посетителя есть cookie сессии и CSRF-токен.
+    """
+
+    def __init__(self, application, results, address, session_key=None):
+        self.application = application
+        self.results = results
+        # у каждого посетителя свой адрес, как у живых клиентов
+        self.address = address
+        self.cookies = {}
+        self.csrf_token = None
+        if session_key:
+            self.csrf_token = _get_new_csrf_token()
+            self.cookies = {
+                settings.SESSION_COOKIE_NAME: session_key,
+                settings.CSRF_COOKIE_NAME: self.csrf_token,
+            }
+
+    def request(self, method, path, query=None, data=None):
+        body = b''
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.csrf_token)
+            body = urlencode(data).encode()
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(query or {}),
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'REMOTE_ADDR': self.address,
+            'HTTP_COOKIE': '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()
+            ),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+
+        view_name = resolve(path).view_name
+        start = time.perf_counter()
+        response = self.application(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            # close() отправляет request_finished: Django закрывает
+            # соединение, если оно устарело или неисправно
+            response.close()
+        self.results.append(
+            (view_name, time.perf_counter() - start, status[0])
+        )
+
+
+class Traffic:
+    """Сценарии посещений; объекты выбираются по тому же закону Zipf."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.usernames = list(User.objects.values_list('username', flat=True))
+        self.user_weights = zipf_weights(len(self.usernames))
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.post_ids = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[:10000]
+        )
+        self.post_weights = zipf_weights(len(self.post_ids))
+
+    def username(self):
+        return self.rng.choices(
+            self.usernames, cum_weights=self.user_weights,
+        )[0]
+
+    def post_id(self):
+        return self.rng.choices(
+            self.post_ids, cum_weights=self.post_weights,
+        )[0]
+
+    def anonymous_browse(self, guest, user):
+        guest.request('GET', '/')
+        for page in range(2, self.rng.randint(2, 4)):
+            guest.request('GET', '/', {'page': page})
+        if self.slugs:
+            guest.request('GET', f'/group/{self.rng.choice(self.slugs)}/')
+
+    def follow_feed(self, guest, user):
+        user.request('GET', '/follow/')
+
+    def profile(self, guest, user):
+        guest.request('GET', f'/profile/{self.username()}/')
+
+    def post_detail(self, guest, user):
+        guest.request('GET', f'/posts/{self.post_id()}/')
+
+    def posting(self, guest, user):
+        user.request('GET', '/create/')
+        user.request('POST', '/create/', data={'text': sentence(self.rng)})
+
+
+def login_sessions(count, rng):
+    """Сессии случайных пользователей с подписками, как после входа."""
+    followers = list(
+        Follow.objects.values_list('user_id', flat=True).distinct()
+    )
+    users = User.objects.filter(
+        pk__in=rng.sample(followers, min(count, len(followers))),
+    )
+    backend = settings.AUTHENTICATION_BACKENDS[0]
+    keys = []
+    for user in users:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = backend
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        keys.append(session.session_key)
+    return keys
+
+
+def run(application, args, session_keys):
+    """Гоняет трафик warmup + duration секунд, возвращает замеры."""
+    names = list(MIX)
+    weights = list(MIX.values())
+    results = []
+    measured_from = time.perf_counter() + args.warmup
+    deadline = measured_from + args.duration
+
+    def worker(number):
+        rng = random.Random(args.seed + number)
+        traffic = Traffic(rng)
+        connection.close()
+        own = []
+        guest = Client(application, own, f'10.255.0.{number % 256}')
+        users = [
+            Client(application, own, f'10.0.{i // 256}.{i % 256}', key)
+            for i, key in enumerate(session_keys)
+        ]
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            del own[:]
+            getattr(traffic, scenario)(guest, rng.choice(users))
+            if started >= measured_from:
+                results.extend(own)
+
+    threads = [
+        threading.Thread(target=worker, args=(number,))
+        for number in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(samples, duration):
+    latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for *_, status in samples if status >= 400),
+        'throughput': round(len(samples) / duration, 2),
+        'p50_ms': round(p50, 2),
+        'p95_ms': round(p95, 2),
+        'p99_ms': round(p99, 2),
+    }
+
+
+def report(results, duration):
+    by_view = defaultdict(list)
+    for sample in results:
+        by_view[sample[0]].append(sample)
+    views = {
+        name: summarize(samples, duration)
+        for name, samples in sorted(by_view.items())
+    }
+    return views, summarize(results, duration) if results else None
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(views, total, baseline=None):
+    print(
+        f'{"view":<24} {"запр.":>7} {"ошиб.":>6} {"rps":>8} '
+        f'{"p50":>8} {"p95":>8} {"p99":>8}'
+    )
+    rows = list(views.items()) + [('всего', total)]
+    for name, row in rows:
+        print(
+            f'{name:<24} {row["requests"]:>7} {row["errors"]:>6} '
+            f'{row["throughput"]:>8} {row["p50_ms"]:>8} '
+            f'{row["p95_ms"]:>8} {row["p99_ms"]:>8}'
+        )
+        old = (baseline or {}).get(name)
+        if old:
+            # изменение относительно прошлого прогона, в процентах
+            deltas = ' '.join(
+                f'{(row[key] / old[key] - 1) * 100 if old[key] else 0:>+7.0f}%'
+                for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')
+            )
+            print(f'{"":<24} {"":>7} {"":>6} {deltas}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--follows', type=float, default=10)
+    parser.add_argument('--timeline-length', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--database',
+        default=os.path.join(tempfile.gettempdir(), 'yatube_load.sqlite3'),
+    )
+    parser.add_argument(
+        '--reuse', action='store_true',
+        help='не заполнять базу, если она уже есть',
+    )
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--output', default='load_test.json')
+    parser.add_argument('--compare', help='JSON прошлого прогона')
+    parser.add_argument(
+        '--ratelimit', action='store_true',
+        help='не отключать ограничение частоты записей',
+    )
+    args = parser.parse_args()
+
+    # соединения и кэш создаются при первом обращении,
+    # поэтому настройки еще можно подменить
+    exists = args.reuse and os.path.exists(args.database)
+    if not args.reuse and os.path.exists(args.database):
+        os.remove(args.database)
+    settings.DATABASES['default']['NAME'] = args.database
+    settings.CACHES['default']['LOCATION'] = args.database + '.cache'
+    # с DEBUG Django копит все SQL-запросы в памяти
+    settings.DEBUG = False
+    # синтетические посетители пишут чаще живых и получали бы 429
+    settings.RATELIMIT_ENABLED = args.ratelimit
+    assert connection.settings_dict['NAME'] == args.database
+
+    call_command('migrate', verbosity=0)
+    if not exists:
+        started = time.perf_counter()
+        call_command(
+            'seed_yatube', users=args.users, groups=args.groups,
+            posts=args.posts, comments=args.comments, follows=args.follows,
+            timeline_length=args.timeline_length, seed=args.seed,
+        )
+        print(f'база заполнена за {time.perf_counter() - started:.0f} с')
+    dataset = {
+        'users': User.objects.count(),
+        'posts': Post.objects.count(),
+        'follows': Follow.objects.count(),
+        'comments': Comment.objects.count(),
+    }
+    print(', '.join(f'{name}: {count}' for name, count in dataset.items()))
+    session_keys = login_sessions(args.sessions, random.Random(args.seed))
+    if not session_keys:
+        sys.exit('нет пользователей с подписками для входа')
+    connection.close()
+
+    results = run(application, args, session_keys)
+    views, total = report(results, args.duration)
+    if total is None:
+        sys.exit('за время замера не выполнено ни одного запроса')
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+        baseline = dict(previous['views'], **{'всего': previous['total']})
+    print_table(views, total, baseline)
+
+    with open(args.output, 'w') as file:
+        json.dump({
+            'commit': current_commit(),
+            'dataset': dataset,
+            'threads': args.threads,
+            'duration': args.duration,
+            'views': views,
+            'total': total,
+        }, file, ensure_ascii=False, indent=2)
+    print(f'результаты сохранены в {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Накладные расходы ограничения частоты запросов (core/ratelimit.py).
+
+Запуск из корня репозитория:
+
+    python benchmarks/ratelimit_overhead.py --requests 20000
+
+Для LocMemCache и core.cache.SQLiteCache меряется вызов пустого view
+через декоратор ratelimit: без ограничения, с корзиной по IP и с
+корзинами по IP и пользователю, а также отказ с ответом 429. Разница
+с вызовом без декоратора - цена проверки на один запрос записи.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yatube')
+)
+
+from django.conf import settings  # noqa: E402
+
+DIRECTORY = tempfile.mkdtemp()
+OPTIONS = {'MAX_ENTRIES': 10 ** 6}
+
+settings.configure(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': OPTIONS,
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(DIRECTORY, 'cache.sqlite3'),
+        'OPTIONS': OPTIONS,
+    },
+})
+
+from django.core.cache import caches  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from core import ratelimit  # noqa: E402
+
+
+class User:
+    is_authenticated = True
+
+    def __init__(self, pk):
+        self.pk = pk
+
+
+def view(request):
+    return HttpResponse()
+
+
+VARIANTS = {
+    'без декоратора': view,
+    'IP': ratelimit.ratelimit('bench', ip='1000000/s')(view),
+    'IP и пользователь': ratelimit.ratelimit(
+        'bench', user='1000000/s', ip='1000000/s',
+    )(view),
+    # корзина на день в один токен: все запросы, кроме первого, - 429
+    'отказ 429': ratelimit.ratelimit('bench', ip='1/d')(view),
+}
+
+
+def timed(view, requests, same_client):
+    """Микросекунд на запрос; без same_client у запросов разные IP."""
+    factory = RequestFactory()
+    batch = []
+    for i in range(requests):
+        if same_client:
+            i = 0
+        request = factory.post(
+            '/', REMOTE_ADDR=f'10.0.{i // 256 % 256}.{i % 256}',
+        )
+        request.user = User(i)
+        batch.append(request)
+    view(batch[0])
+    start = time.perf_counter()
+    for request in batch[1:]:
+        view(request)
+    return (time.perf_counter() - start) / (requests - 1) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    try:
+        print(f'{"кэш":<8} {"вариант":<20} {"мкс/запрос":>11} {"прибавка":>9}')
+        for name in ('locmem', 'sqlite'):
+            # декоратор работает с кэшем по умолчанию
+            ratelimit.cache = caches[name]
+            baseline = None
+            for label, decorated in VARIANTS.items():
+                ratelimit.cache.clear()
+                cost = timed(
+                    decorated, args.requests, same_client=label == 'отказ 429',
+                )
+                if baseline is None:
+                    baseline = cost
+                print(
+                    f'{name:<8} {label:<20} {cost:>11.1f} '
+                    f'{cost - baseline:>+9.1f}'
+                )
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
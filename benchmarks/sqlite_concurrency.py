@@ -0,0 +1,228 @@
+"""
+Пропускная способность SQLite при одновременных чтениях и записях.
+
+Запуск из корня репозитория:
+
+    python benchmarks/sqlite_concurrency.py --workers 8 --duration 10
+
+Воркеры - отдельные процессы, как у gunicorn, - выполняют «запросы»
+к одной базе: чтение - страница ленты, число постов автора и
+комментарии к посту; запись - транзакция, которая проверяет пост,
+добавляет комментарий и увеличивает счетчик. Запрос окружен сигналами
+request_started и request_finished, поэтому соединения открываются и
+закрываются так же, как в Django.
+
+Сравниваются профили: стандартный бэкенд (журнал отката, новое
+соединение на каждый запрос) и core.backends.sqlite3 (WAL, PRAGMA,
+BEGIN IMMEDIATE, постоянные соединения с проверкой). Печатаются
+запросы в секунду, задержки p50/p99 (мс) и число ошибок
+«database is locked».
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yatube')
+)
+
+from django.conf import settings  # noqa: E402
+
+DIRECTORY = tempfile.mkdtemp()
+PROFILES = {
+    'стандартный': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(DIRECTORY, 'default.sqlite3'),
+    },
+    'core': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(DIRECTORY, 'core.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+settings.configure(DATABASES={
+    # Django требует псевдоним default
+    'default': PROFILES['стандартный'],
+    **PROFILES,
+})
+
+from django.core import signals  # noqa: E402
+from django.db import OperationalError, connections, transaction  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    author_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    pub_date REAL NOT NULL,
+    comments INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX post_pub_date ON post (pub_date);
+CREATE INDEX post_author ON post (author_id, pub_date);
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX comment_post ON comment (post_id, created);
+"""
+AUTHORS = 1000
+PAGE = 10
+
+
+def create_database(alias, posts):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+        with transaction.atomic(using=alias):
+            cursor.executemany(
+                'INSERT INTO post (author_id, text, pub_date) '
+                'VALUES (%s, %s, %s)',
+                [
+                    (number % AUTHORS, 'пост ' * 40, number)
+                    for number in range(posts)
+                ],
+            )
+    connection.close()
+
+
+def read(cursor, rng, posts):
+    cursor.execute(
+        'SELECT id, author_id, text FROM post '
+        'ORDER BY pub_date DESC LIMIT %s OFFSET %s',
+        [PAGE, rng.randrange(0, 100) * PAGE],
+    )
+    cursor.fetchall()
+    cursor.execute(
+        'SELECT count(*) FROM post WHERE author_id = %s',
+        [rng.randrange(AUTHORS)],
+    )
+    cursor.fetchone()
+    cursor.execute(
+        'SELECT author_id, text FROM comment WHERE post_id = %s '
+        'ORDER BY created',
+        [rng.randrange(1, posts + 1)],
+    )
+    cursor.fetchall()
+
+
+def write(cursor, rng, posts):
+    post_id = rng.randrange(1, posts + 1)
+    # чтение перед записью в одной транзакции, как в view
+    cursor.execute('SELECT id FROM post WHERE id = %s', [post_id])
+    cursor.fetchone()
+    cursor.execute(
+        'INSERT INTO comment (post_id, author_id, text, created) '
+        'VALUES (%s, %s, %s, %s)',
+        [post_id, rng.randrange(AUTHORS), 'комментарий', time.time()],
+    )
+    cursor.execute(
+        'UPDATE post SET comments = comments + 1 WHERE id = %s', [post_id],
+    )
+
+
+def worker(alias, number, args, deadline, results):
+    rng = random.Random(args.seed + number)
+    connection = connections[alias]
+    latencies = {'чтение': [], 'запись': []}
+    errors = dict.fromkeys(latencies, 0)
+    while time.perf_counter() < deadline:
+        kind = 'запись' if rng.random() * 100 < args.writes else 'чтение'
+        started = time.perf_counter()
+        signals.request_started.send(sender=None)
+        try:
+            if kind == 'запись':
+                with transaction.atomic(using=alias):
+                    write(connection.cursor(), rng, args.posts)
+            else:
+                read(connection.cursor(), rng, args.posts)
+        except OperationalError:
+            errors[kind] += 1
+        else:
+            latencies[kind].append(time.perf_counter() - started)
+        finally:
+            signals.request_finished.send(sender=None)
+    connection.close()
+    results.put((latencies, errors))
+
+
+def run(alias, args):
+    """Запускает воркеров на args.duration секунд, собирает замеры."""
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.perf_counter() + args.duration
+    processes = [
+        context.Process(
+            target=worker, args=(alias, number, args, deadline, results),
+        )
+        for number in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    latencies = {'чтение': [], 'запись': []}
+    errors = dict.fromkeys(latencies, 0)
+    for _ in processes:
+        own, own_errors = results.get()
+        for kind, values in own.items():
+            latencies[kind].extend(values)
+            errors[kind] += own_errors[kind]
+    for process in processes:
+        process.join()
+    return latencies, errors
+
+
+def percentile(values, share):
+    if len(values) < 2:
+        return values[0] * 1000 if values else 0
+    return statistics.quantiles(values, n=100)[share - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument(
+        '--writes', type=float, default=20, help='доля записей, %%',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        print(
+            f'{"профиль":<12} {"запрос":<7} {"в секунду":>10} '
+            f'{"p50":>7} {"p99":>7} {"ошибок":>7}'
+        )
+        throughput = {}
+        for alias in PROFILES:
+            create_database(alias, args.posts)
+            latencies, errors = run(alias, args)
+            throughput[alias] = sum(map(len, latencies.values()))
+            for kind, values in latencies.items():
+                print(
+                    f'{alias:<12} {kind:<7} '
+                    f'{len(values) / args.duration:>10.0f} '
+                    f'{percentile(values, 50):>7.2f} '
+                    f'{percentile(values, 99):>7.2f} '
+                    f'{errors[kind]:>7}'
+                )
+        baseline, tuned = throughput.values()
+        print(f'прирост пропускной способности: x{tuned / baseline:.1f}')
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Запросы к хранилищу миниатюр sorl на одну страницу списка постов.
+
+Запуск из корня репозитория:
+
+    python benchmarks/thumbnail_lookup.py --posts 10 --repeat 200
+
+«Было» - тег {% thumbnail %} у каждой карточки: отдельное обращение
+к кэшу, а при холодном кэше еще и к базе, на каждый пост. «Стало» -
+posts.thumbnails.attach_thumbnails(): одно обращение к кэшу и не больше
+одного запроса к базе на страницу. Используется тестовая база в памяти
+и кэш SQLiteCache во временном файле.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yatube')
+)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.files.base import ContentFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext, override_settings,
+)
+from PIL import Image  # noqa: E402
+from sorl.thumbnail.base import ThumbnailBackend  # noqa: E402
+
+from posts import thumbnails  # noqa: E402
+from posts.models import Post  # noqa: E402
+
+PER_TAG = Template(
+    '{% load thumbnail %}{% for post in posts %}'
+    '{% thumbnail post.image "960x339" crop="center" upscale=True as im %}'
+    '{{ im.url }}{% endthumbnail %}{% endfor %}'
+)
+
+
+class CacheCalls:
+    """Считает обращения к кэшу (каждое - отдельный запрос к SQLite)."""
+
+    METHODS = ('get', 'get_many', 'set', 'set_many', 'add')
+
+    def __init__(self):
+        self.count = 0
+        self.originals = {}
+
+    def __enter__(self):
+        for name in self.METHODS:
+            original = getattr(cache, name)
+            self.originals[name] = original
+            setattr(cache, name, self.counted(original))
+        return self
+
+    def counted(self, method):
+        def wrapper(*args, **kwargs):
+            self.count += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def __exit__(self, *exc_info):
+        for name in self.METHODS:
+            delattr(cache, name)
+
+
+def make_posts(count):
+    author = get_user_model().objects.create_user(username='bench')
+    geometry, options = thumbnails.GEOMETRIES[0]
+    for number in range(count):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), (number * 20 % 256, 80, 160)).save(
+            buffer, 'JPEG',
+        )
+        post = Post.objects.create(text=f'Пост {number}', author=author)
+        post.image.save(f'bench{number}.jpg', ContentFile(buffer.getvalue()))
+        ThumbnailBackend().get_thumbnail(post.image.name, geometry, **options)
+
+
+def per_tag(posts):
+    PER_TAG.render(Context({'posts': posts}))
+
+
+def batched(posts):
+    thumbnails.attach_thumbnails(posts)
+
+
+def measure(function, posts, cold, repeat):
+    # первый прогон считает запросы, остальные - время
+    if cold:
+        cache.clear()
+    with CaptureQueriesContext(connection) as queries, CacheCalls() as calls:
+        function(posts)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        function(posts)
+    elapsed = (time.perf_counter() - start) / repeat
+    return len(queries.captured_queries), calls.count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--posts', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    caches = {'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+    }}
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(
+            MEDIA_ROOT=directory, CACHES=caches, THUMBNAIL_WORKERS=0,
+        ):
+            make_posts(args.posts)
+            posts = list(Post.objects.for_cards()[:args.posts])
+            print(f'страница из {len(posts)} постов с картинками')
+            print(
+                f'{"способ":<10} {"кэш":<9} {"SQL":>5} '
+                f'{"к кэшу":>7} {"мс/стр":>8}'
+            )
+            for cold in (True, False):
+                for name, function in (
+                    ('per-tag', per_tag), ('batched', batched),
+                ):
+                    sql, calls, elapsed = measure(
+                        function, posts, cold, args.repeat,
+                    )
+                    state = 'холодный' if cold else 'теплый'
+                    print(
+                        f'{name:<10} {state:<9} {sql:>5} '
+                        f'{calls:>7} {elapsed * 1000:>8.2f}'
+                    )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост {i}', author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(25)
+        )
+        cls.newest_first = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True,
+            )
+        )
+        Comment.objects.create(
+            text='Комментарий', post_id=cls.newest_first[0], author=cls.user,
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def get_json(self, url, client=None, **params):
+        response = (client or self.guest_client).get(url, params)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        return response, json.loads(content)
+
+    def test_listing_is_streamed_by_cursor(self):
+        """Список отдается потоком и листается курсором до конца."""
+        url = reverse('api:index')
+        response, data = self.get_json(url, limit=10)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        seen = [post['id'] for post in data['results']]
+        while data['next']:
+            response, data = self.get_json(
+                url, limit=10, after=data['next'],
+            )
+            seen.extend(post['id'] for post in data['results'])
+        self.assertEqual(seen, self.newest_first)
+
+    def test_fields_selection(self):
+        """?fields= оставляет в постах только выбранные поля."""
+        response, data = self.get_json(
+            reverse('api:index'), fields='id,author,comment_count',
+        )
+        self.assertEqual(data['results'][0], {
+            'id': self.newest_first[0],
+            'author': 'author',
+            'comment_count': 1,
+        })
+
+    def test_bad_parameters(self):
+        """Ошибки в параметрах - ответ 400 с описанием в JSON."""
+        for params in (
+            {'fields': 'id,password'},
+            {'limit': 'all'},
+            {'limit': 0},
+            {'after': 'испорчен'},
+        ):
+            with self.subTest(params=params):
+                response, data = self.get_json(reverse('api:index'), **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', data)
+
+    def test_scoped_listings(self):
+        """Группа, автор и лента подписок отдают свои посты."""
+        pages = {
+            reverse('api:group_posts', kwargs={'slug': 'test-slug'}): 12,
+            reverse('api:profile', kwargs={'username': 'author'}): 25,
+            reverse('api:follow_index'): 25,
+        }
+        for url, count in pages.items():
+            with self.subTest(url=url):
+                response, data = self.get_json(
+                    url, self.authorized_client, limit=100,
+                )
+                self.assertEqual(len(data['results']), count)
+                self.assertIsNone(data['next'])
+
+    def test_follow_requires_login(self):
+        """Лента подписок без входа - 401."""
+        response, data = self.get_json(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_missing_objects(self):
+        """Несуществующие объекты - 404 в JSON."""
+        for url in (
+            reverse('api:group_posts', kwargs={'slug': 'missing'}),
+            reverse('api:post_detail', kwargs={'post_id': 0}),
+        ):
+            with self.subTest(url=url):
+                response, data = self.get_json(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('error', data)
+
+    def test_query_count_does_not_depend_on_limit(self):
+        """Число запросов не зависит от числа постов на странице."""
+        for limit in (1, 25):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(1):
+                    self.get_json(reverse('api:index'), limit=limit)
+
+    def test_post_detail(self):
+        """Пост отдается с последними комментариями."""
+        url = reverse(
+            'api:post_detail', kwargs={'post_id': self.newest_first[0]},
+        )
+        response, data = self.get_json(url, fields='id,text')
+        self.assertEqual(data['id'], self.newest_first[0])
+        self.assertEqual(data['text'], 'Пост 24')
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий'],
+        )
+        self.assertIsNone(data['comments_next'])
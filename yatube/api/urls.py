@@ -0,0 +1,28 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    # Главная лента
+    path('posts/', views.index, name='index'),
+    # Пост с последними комментариями
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    # Следующие комментарии к посту
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    # Посты группы
+    path('groups/<slug:slug>/posts/', views.group_posts, name='group_posts'),
+    # Посты автора
+    path(
+        'profiles/<str:username>/posts/',
+        views.profile,
+        name='profile'
+    ),
+    # Лента подписок
+    path('follow/', views.follow_index, name='follow_index'),
+]
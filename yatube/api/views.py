@@ -0,0 +1,198 @@
+"""
+JSON API только для чтения: те же ленты и посты, что и на сайте.
+
+Списки отдаются потоком (StreamingHttpResponse): посты читаются из базы
+порциями через iterator() и сразу уходят клиенту, поэтому память
+не растет с ?limit= и API годится для выгрузок. Листаются списки
+курсором ?after=, как на сайте; ?fields= выбирает поля поста.
+"""
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from posts.models import Group, Post, User
+from posts.pagination import CursorPaginator, comment_page
+from posts.views import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+# больше постов за один запрос не отдаем
+MAX_LIMIT = 10000
+# сколько постов читать из базы и отправлять клиенту за раз
+CHUNK_SIZE = 500
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'updated': lambda post: post.updated,
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'comment_count': lambda post: post.comment_count,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """Ошибки запроса отдаются клиенту в JSON, а не HTML-страницей."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return error_response(str(error), error.status)
+        except Http404:
+            return error_response('Не найдено', 404)
+    return wrapper
+
+
+def error_response(message, status):
+    return JsonResponse(
+        {'error': message}, status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def encode(value):
+    return json.dumps(
+        value, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':'),
+    )
+
+
+def get_fields(request):
+    """Поля поста из ?fields=id,text; по умолчанию - все."""
+    value = request.GET.get('fields')
+    if value is None:
+        return list(POST_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in POST_FIELDS]
+    if unknown or not fields:
+        raise ApiError(
+            f'Неизвестные поля: {", ".join(unknown)}; '
+            f'доступны: {", ".join(POST_FIELDS)}'
+        )
+    return fields
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return limit
+
+
+def serialize_post(post, fields):
+    return {field: POST_FIELDS[field](post) for field in fields}
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    }
+
+
+def stream_posts(request, posts):
+    """
+    Страница постов после курсора ?after= потоком:
+    {"results": [...], "next": курсор следующей страницы или null}.
+    """
+    fields = get_fields(request)
+    limit = get_limit(request)
+    paginator = CursorPaginator(posts, limit)
+    posts = paginator.object_list
+    if 'after' in request.GET:
+        after = paginator.filter_after(request.GET['after'])
+        if after is None:
+            raise ApiError('Испорченный курсор')
+        posts = posts.filter(after)
+    # лишний пост показывает, есть ли следующая страница
+    rows = posts[:limit + 1].iterator(chunk_size=CHUNK_SIZE)
+
+    def content():
+        parts = ['{"results":[']
+        last = next_cursor = None
+        for number, post in enumerate(rows):
+            if number == limit:
+                next_cursor = paginator.get_cursor(last)
+                break
+            if number:
+                parts.append(',')
+            parts.append(encode(serialize_post(post, fields)))
+            last = post
+            if len(parts) >= CHUNK_SIZE:
+                yield ''.join(parts)
+                parts = []
+        parts.append(f'],"next":{encode(next_cursor)}}}')
+        yield ''.join(parts)
+
+    return StreamingHttpResponse(content(), content_type='application/json')
+
+
+@api_view
+def index(request):
+    return stream_posts(request, Post.objects.for_cards())
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return stream_posts(request, group.posts.for_cards())
+
+
+@api_view
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return stream_posts(request, author.posts.for_cards())
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужно войти', status=401)
+    return stream_posts(
+        request, Post.objects.for_cards().in_timeline(request.user),
+    )
+
+
+@api_view
+def post_detail(request, post_id):
+    """Пост с последними комментариями и курсором следующих."""
+    fields = get_fields(request)
+    post = get_object_or_404(Post.objects.for_cards(), pk=post_id)
+    comments, comments_cursor = comment_page(
+        post.comments.select_related('author'), COMMENTS_PER_PAGE,
+    )
+    data = serialize_post(post, fields)
+    data['comments'] = [serialize_comment(comment) for comment in comments]
+    data['comments_next'] = comments_cursor
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, comments_cursor = comment_page(
+        post.comments.select_related('author'), COMMENTS_PER_PAGE,
+        request.GET.get('after'),
+    )
+    return JsonResponse(
+        {
+            'results': [serialize_comment(comment) for comment in comments],
+            'next': comments_cursor,
+        },
+        json_dumps_params={'ensure_ascii': False},
+    )
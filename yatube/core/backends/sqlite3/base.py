@@ -0,0 +1,142 @@
+"""
+Бэкенд SQLite для работы под нагрузкой: ENGINE = 'core.backends.sqlite3'.
+
+Стандартный бэкенд открывает базу в режиме журнала отката: пишущая
+транзакция блокирует читателей, а одновременные писатели получают
+«database is locked». Здесь каждое новое соединение выполняет PRAGMA
+из PRAGMAS, которые дополняются и переопределяются OPTIONS['pragmas']:
+
+* journal_mode = WAL - читатели не ждут писателя, писатель не ждет
+  читателей;
+* synchronous = NORMAL - в режиме WAL fsync только при контрольной
+  точке: сбой питания может потерять последние коммиты, но не
+  испортить базу;
+* busy_timeout - сколько миллисекунд ждать блокировку записи,
+  прежде чем вернуть ошибку;
+* mmap_size и cache_size - страницы читаются из отображенного в память
+  файла и кэша соединения, а не системными вызовами.
+
+transaction.atomic() начинает транзакцию с BEGIN IMMEDIATE
+(OPTIONS['transaction_mode']): блокировка записи берется сразу и ждет
+busy_timeout. Транзакция с обычным BEGIN, которая сначала читает,
+а потом пишет, получает «database is locked» без ожидания, если другой
+писатель успел раньше: дождаться его SQLite не может.
+
+Соединение переиспользуется запросами CONN_MAX_AGE секунд. С
+CONN_HEALTH_CHECKS, как в Django 4.1, перед первым обращением в запросе
+оно проверяется: отвечает ли база и тот ли это файл. Если базу удалили
+и создали заново (восстановление из копии), старое соединение читало бы
+удаленный файл. Живую базу в режиме WAL восстанавливают backup API,
+как sync_replicas: подмена файла при открытых соединениях оставляет
+чужой журнал -wal рядом с новым файлом.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательный размер - в килобайтах, на каждое соединение
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.file_identity = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    @property
+    def pragmas(self):
+        return {**PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+
+    @property
+    def transaction_mode(self):
+        return self.settings_dict['OPTIONS'].get(
+            'transaction_mode', 'IMMEDIATE',
+        )
+
+    def check_settings(self):
+        super().check_settings()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # свои параметры в sqlite3.connect() не передаются
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def enable_constraint_checking(self):
+        # schema_editor() включает внешние ключи после миграции; если
+        # OPTIONS['pragmas'] их выключили, они остаются выключенными
+        if self.pragmas.get('foreign_keys', 1):
+            super().enable_constraint_checking()
+
+    def connect(self):
+        super().connect()
+        self.file_identity = self.get_file_identity()
+        # новое соединение проверять незачем
+        self.health_check_done = True
+
+    def get_file_identity(self):
+        """Устройство и inode файла базы; None, если файла нет."""
+        if self.is_in_memory_db():
+            return None
+        try:
+            stat = os.stat(self.settings_dict['NAME'])
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def is_usable(self):
+        if self.get_file_identity() != self.file_identity:
+            return False
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        # вызывается в начале и в конце каждого запроса
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,352 @@
+"""
+Кэш в файле SQLite, общий для всех процессов на одном сервере.
+
+В отличие от LocMemCache, копия кэша одна на все воркеры gunicorn:
+память не растет с числом воркеров, а инвалидация в одном воркере
+сразу видна остальным. Файл открывается в режиме WAL с mmap, поэтому
+чтения не блокируют друг друга и почти не делают системных вызовов.
+
+Размер ограничен числом записей (MAX_ENTRIES) и объемом (MAX_BYTES);
+при переполнении удаляются давно не читанные записи (приближенный LRU:
+время обращения обновляется не чаще раза в LRU_RESOLUTION секунд).
+Целые числа хранятся как INTEGER: incr() увеличивает их прямо в базе
+внутри пишущей транзакции и поэтому атомарен между процессами.
+Попадания и промахи get() учитываются в метриках запроса (core.metrics).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entry_insert
+AFTER INSERT ON cache_entry BEGIN
+    UPDATE cache_stats
+    SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_delete
+AFTER DELETE ON cache_entry BEGIN
+    UPDATE cache_stats
+    SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_update
+AFTER UPDATE OF size ON cache_entry BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache_entry (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+"""
+
+
+class SQLiteCache(BaseCache):
+    """
+    Бэкенд кэша Django. LOCATION - путь к файлу базы.
+
+    Дополнительные OPTIONS:
+      MAX_BYTES - предельный объем значений в байтах;
+      LRU_RESOLUTION - как часто обновлять время обращения, в секундах;
+      MMAP_SIZE - сколько байт файла отображать в память.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 0)) or None
+        self._lru_resolution = float(options.get('LRU_RESOLUTION', 1))
+        self._mmap_size = int(options.get('MMAP_SIZE', 256 * 1024 * 1024))
+        self._local = threading.local()
+
+    # Соединение
+
+    @property
+    def _db(self):
+        # соединение свое у каждого потока и у каждого процесса после fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.db = self._connect()
+            local.pid = os.getpid()
+        return local.db
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None,
+            check_same_thread=False,
+        )
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        db.execute(f'PRAGMA mmap_size = {self._mmap_size}')
+        db.executescript(SCHEMA)
+        return db
+
+    # Сериализация
+
+    def _encode(self, value):
+        # целые числа храним как есть - для атомарного incr()
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value, 8
+        data = pickle.dumps(value, self.pickle_protocol)
+        return data, len(data)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    # Чтение
+
+    def _touch_accessed(self, keys, now):
+        self._db.executemany(
+            'UPDATE cache_entry SET accessed = ? WHERE key = ?',
+            [(now, key) for key in keys],
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        row = self._db.execute(
+            'SELECT value, expires, accessed FROM cache_entry WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            metrics.cache_lookup(0, 1)
+            return default
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            self._delete(key)
+            metrics.cache_lookup(0, 1)
+            return default
+        if now - accessed > self._lru_resolution:
+            self._touch_accessed([key], now)
+        metrics.cache_lookup(1, 0)
+        return self._decode(value)
+
+    def get_many(self, keys, version=None):
+        keys_map = {self.make_key(key, version=version): key for key in keys}
+        for key in keys_map:
+            self.validate_key(key)
+        if not keys_map:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys_map))
+        rows = self._db.execute(
+            'SELECT key, value, expires, accessed FROM cache_entry '
+            f'WHERE key IN ({placeholders})',
+            list(keys_map),
+        ).fetchall()
+        result, expired, stale = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            if now - accessed > self._lru_resolution:
+                stale.append(key)
+            result[keys_map[key]] = self._decode(value)
+        if expired:
+            self._delete_many(expired)
+        if stale:
+            self._touch_accessed(stale, now)
+        metrics.cache_lookup(len(result), len(keys_map) - len(result))
+        return result
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    # Запись
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set_many([(key, value)], self.get_backend_timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        self._set_many(items, self.get_backend_timeout(timeout))
+        return []
+
+    def _set_many(self, items, expires):
+        now = time.time()
+        rows = []
+        for key, value in items:
+            value, size = self._encode(value)
+            rows.append((key, value, expires, now, size))
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(UPSERT, rows)
+            self._cull()
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        data, size = self._encode(value)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # просроченную запись add() перезаписывает
+            db.execute(
+                'DELETE FROM cache_entry WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO cache_entry '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, data, self.get_backend_timeout(timeout), now, size),
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._cull()
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._db.execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db
+        # одна транзакция на запись: инкремент атомарен между процессами
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'UPDATE cache_entry SET value = value + ? '
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, key, time.time()),
+            )
+            row = db.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ?',
+                (key,),
+            ).fetchone()
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            raise ValueError("Key '%s' not found" % key)
+        if not isinstance(row[0], int):
+            raise TypeError("Value of key '%s' is not an integer" % key)
+        return row[0]
+
+    # Удаление
+
+    def _delete(self, key):
+        cursor = self._db.execute(
+            'DELETE FROM cache_entry WHERE key = ?', (key,),
+        )
+        return cursor.rowcount == 1
+
+    def _delete_many(self, keys):
+        self._db.executemany(
+            'DELETE FROM cache_entry WHERE key = ?', [(key,) for key in keys],
+        )
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._delete(key)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self._delete_many(keys)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache_entry')
+
+    def _cull(self):
+        """Вытесняет записи сверх лимитов. Вызывается внутри транзакции."""
+        db = self._db
+        entries, size = db.execute(
+            'SELECT entries, bytes FROM cache_stats',
+        ).fetchone()
+        over_entries = entries > self._max_entries
+        over_bytes = self._max_bytes is not None and size > self._max_bytes
+        if not (over_entries or over_bytes):
+            return
+        db.execute(
+            'DELETE FROM cache_entry WHERE expires <= ?', (time.time(),),
+        )
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache_entry')
+            return
+        entries, size = db.execute(
+            'SELECT entries, bytes FROM cache_stats',
+        ).fetchone()
+        if entries <= self._max_entries and (
+            self._max_bytes is None or size <= self._max_bytes
+        ):
+            return
+        # как и остальные бэкенды Django, удаляем 1/CULL_FREQUENCY записей,
+        # начиная с давно не читанных
+        db.execute(
+            'DELETE FROM cache_entry WHERE key IN ('
+            'SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+            (max(entries // self._cull_frequency, 1),),
+        )
+
+    def close(self, **kwargs):
+        # соединение живет весь процесс, как у файлового кэша
+        pass
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import get_replicas
+
+
+def copy_database(source, target):
+    """
+    Копирует базу SQLite через backup API: копия согласована, даже
+    если в основную базу в это время пишут, а читатели реплики видят
+    либо старую копию, либо новую.
+    """
+    source = sqlite3.connect(source)
+    target = sqlite3.connect(target)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять копирование каждые N секунд',
+        )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError('В DATABASE_REPLICAS нет реплик')
+        source = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        while True:
+            started = time.monotonic()
+            for alias in replicas:
+                copy_database(source, connections[alias].settings_dict['NAME'])
+            self.stdout.write(
+                f'Реплики обновлены за {time.monotonic() - started:.2f} с'
+            )
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
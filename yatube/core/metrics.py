@@ -0,0 +1,190 @@
+"""
+Метрики запросов в формате Prometheus.
+
+MetricsMiddleware собирает для каждого запроса время ответа, число
+и время SQL-запросов, попадания и промахи кэша и время отрисовки
+шаблонов, а затем одним вызовом записывает их в гистограммы реестра
+с меткой view - именем URL (posts:index, posts:profile, ...).
+
+Реестр живет в памяти процесса: у каждого воркера gunicorn свои
+метрики, и Prometheus различает их по адресу воркера или по метке
+instance. Запись - несколько сложений под одной блокировкой на запрос.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# границы корзин гистограмм времени, в секундах
+DURATION_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+# границы корзин для числа SQL-запросов на запрос
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    'yatube_request_duration_seconds': (
+        'Время ответа', DURATION_BUCKETS,
+    ),
+    'yatube_db_queries': (
+        'Число SQL-запросов на запрос', COUNT_BUCKETS,
+    ),
+    'yatube_db_duration_seconds': (
+        'Суммарное время SQL-запросов на запрос', DURATION_BUCKETS,
+    ),
+    'yatube_template_render_seconds': (
+        'Время отрисовки шаблонов на запрос', DURATION_BUCKETS,
+    ),
+}
+COUNTERS = {
+    'yatube_cache_hits_total': 'Попадания в кэш',
+    'yatube_cache_misses_total': 'Промахи кэша',
+}
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """Счетчики одного запроса; заполняются по ходу его обработки."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        # обертка connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def _histogram(self, name, view):
+        key = (name, view)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(
+                HISTOGRAMS[name][1]
+            )
+        return histogram
+
+    def record(self, view, duration, stats):
+        """Записывает метрики завершенного запроса."""
+        with self._lock:
+            self._histogram(
+                'yatube_request_duration_seconds', view,
+            ).observe(duration)
+            self._histogram('yatube_db_queries', view).observe(stats.queries)
+            self._histogram(
+                'yatube_db_duration_seconds', view,
+            ).observe(stats.db_time)
+            self._histogram(
+                'yatube_template_render_seconds', view,
+            ).observe(stats.template_time)
+            for name, value in (
+                ('yatube_cache_hits_total', stats.cache_hits),
+                ('yatube_cache_misses_total', stats.cache_misses),
+            ):
+                key = (name, view)
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        with self._lock:
+            histograms = {
+                key: (list(h.counts), h.sum, h.count)
+                for key, h in self._histograms.items()
+            }
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, view), (counts, total, count) in sorted(
+                histograms.items()
+            ):
+                if metric != name:
+                    continue
+                label = f'view="{escape(view)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f'{name}_bucket{{{label},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{{label}}} {total}')
+                lines.append(f'{name}_count{{{label}}} {count}')
+        for name, help_text in COUNTERS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (metric, view), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{{view="{escape(view)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+registry = Registry()
+
+
+def start():
+    """Начинает сбор счетчиков запроса в текущем потоке."""
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish():
+    _local.stats = None
+
+
+def current():
+    """Счетчики текущего запроса или None, если метрики не собираются."""
+    return getattr(_local, 'stats', None)
+
+
+def cache_lookup(hits, misses):
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def template_rendered(seconds):
+    stats = current()
+    if stats is not None:
+        stats.template_time += seconds
@@ -0,0 +1,67 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics, routers
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики каждого запроса в core.metrics.registry.
+    Должен стоять первым в MIDDLEWARE, чтобы время включало остальные
+    middleware. Отключается настройкой METRICS_ENABLED = False.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.start()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.db_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.finish()
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.registry.record(view, duration, stats)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Разрешает запросу читать реплики (core.routers.ReplicaRouter),
+    а после записи ставит cookie, по которой следующие запросы
+    пользователя REPLICA_STICKY_SECONDS читают основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.get_replicas():
+            return self.get_response(request)
+        routers.begin_request(pinned=routers.PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end_request()
+        if wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
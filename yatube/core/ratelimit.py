@@ -0,0 +1,116 @@
+"""
+Ограничение частоты запросов корзинами токенов (token bucket).
+
+У каждого пользователя и у каждого IP-адреса своя корзина на view:
+в ней до N токенов, и она наполняется со скоростью N токенов за период.
+Запрос тратит токен; если токенов нет, view не вызывается и клиент
+сразу получает короткий ответ 429 с заголовком Retry-After.
+
+Корзина хранится в общем кэше одним целым числом - временем, когда
+она снова станет полной (алгоритм GCRA), - и обновляется только
+атомарными операциями кэша, поэтому лимит общий для всех воркеров:
+
+* add() заводит полную корзину, если ключа нет;
+* incr() забирает токен - сдвигает время наполнения на интервал
+  между токенами; если оно ушло дальше емкости корзины, запрос
+  отклоняется и токен возвращается decr();
+* touch() назначает ключу срок жизни до наполнения корзины: пока
+  ключ есть, корзина не полна, а пропавший ключ означает полную.
+
+Лимиты задаются в декораторе и переопределяются настройкой
+RATELIMITS = {'posts:post_create': {'user': '5/m', 'ip': '20/m'}};
+RATELIMIT_ENABLED = False отключает проверку.
+"""
+import math
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+KEY = 'ratelimit:{}:{}:{}'
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'10/m' -> (10, 60): число токенов и период наполнения в секундах."""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period[-1]] * int(period[:-1] or 1)
+
+
+def take(key, rate, now=None):
+    """
+    Забирает токен из корзины. Возвращает 0, если запрос разрешен,
+    иначе - через сколько секунд появится токен.
+    """
+    count, period = parse_rate(rate)
+    # время в миллисекундах: кэши атомарно увеличивают только целые
+    now = int((time.time() if now is None else now) * 1000)
+    interval = max(period * 1000 // count, 1)
+    capacity = count * interval
+    while True:
+        if cache.add(key, now + interval, interval / 1000):
+            # корзины не было - она полна
+            return 0
+        try:
+            full_at = cache.incr(key, interval)
+            break
+        except ValueError:
+            # ключ истек между add() и incr()
+            continue
+    if full_at - interval < now:
+        # ключ пережил наполнение корзины (кэши округляют сроки):
+        # корзина полна, время наполнения подтягиваем к текущему
+        full_at = cache.incr(key, now + interval - full_at)
+    if full_at - now > capacity:
+        cache.decr(key, interval)
+        return math.ceil((full_at - now - capacity) / 1000)
+    cache.touch(key, (full_at - now) / 1000)
+    return 0
+
+
+def client_ip(request):
+    # за прокси адрес клиента должен подставлять в REMOTE_ADDR сам прокси
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        'Слишком много запросов, повторите позже.\n',
+        content_type='text/plain; charset=utf-8',
+        status=429,
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(name, user=None, ip=None, methods=('POST',)):
+    """
+    Декоратор view: не больше user запросов от пользователя и ip
+    запросов с адреса, например ratelimit('posts:post_create',
+    user='5/m', ip='20/m'). Ограничиваются только методы methods.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method in methods
+                and getattr(settings, 'RATELIMIT_ENABLED', True)
+            ):
+                limits = getattr(settings, 'RATELIMITS', {}).get(name, {})
+                buckets = [('ip', client_ip(request), limits.get('ip', ip))]
+                if request.user.is_authenticated:
+                    buckets.append((
+                        'user', request.user.pk, limits.get('user', user),
+                    ))
+                for kind, value, rate in buckets:
+                    if rate is None:
+                        continue
+                    retry_after = take(KEY.format(name, kind, value), rate)
+                    if retry_after:
+                        return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
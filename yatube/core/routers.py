@@ -0,0 +1,86 @@
+"""
+Чтение с реплик, запись в основную базу.
+
+Реплики перечислены в DATABASE_REPLICAS - это псевдонимы DATABASES
+с копиями основной базы, которые отстают от нее на время репликации.
+Чтобы пользователь сразу видел свои изменения, после записи его
+чтения идут в основную базу: до конца запроса и еще
+REPLICA_STICKY_SECONDS по cookie, которую ставит ReplicaMiddleware.
+
+С реплик читают только запросы, прошедшие через ReplicaMiddleware,
+и только вне транзакций. Команды, фоновые задачи и код внутри
+transaction.atomic() читают основную базу: там сразу после записи
+читают то, что записали. Внутри read_primary() основную базу читает
+и запрос: так строятся страницы, которые кэшируются надолго.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# cookie «пользователь недавно писал»
+PIN_COOKIE = 'db_primary'
+
+_local = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def begin_request(pinned):
+    """Запрос читает реплики, если пользователь недавно не писал."""
+    _local.use_replicas = not pinned
+    _local.wrote = False
+
+
+def end_request():
+    """Возвращает, писал ли запрос в базу."""
+    wrote = getattr(_local, 'wrote', False)
+    _local.use_replicas = _local.wrote = False
+    return wrote
+
+
+@contextmanager
+def read_primary():
+    """Чтения внутри блока идут в основную базу."""
+    use_replicas = getattr(_local, 'use_replicas', False)
+    _local.use_replicas = False
+    try:
+        yield
+    finally:
+        # после записи запрос и так дочитывает из основной базы
+        _local.use_replicas = (
+            use_replicas and not getattr(_local, 'wrote', False)
+        )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            getattr(_local, 'use_replicas', False)
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            replicas = get_replicas()
+            if replicas:
+                return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # после записи запрос дочитывает из основной базы
+        _local.use_replicas = False
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # в репликах те же строки, что и в основной базе
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема приходит в реплики вместе с данными
+        return db not in get_replicas()
@@ -0,0 +1,31 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_rendered(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Шаблонизатор Django, который учитывает время отрисовки в метриках
+    запроса. Вложенные {% include %} входят во время внешнего шаблона.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
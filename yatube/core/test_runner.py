@@ -0,0 +1,74 @@
+"""
+Запуск тестов с отдельным кэшем: TEST_RUNNER = 'core.test_runner.Runner'.
+
+Кэш проекта - файл SQLite, общий для всех процессов на машине (см.
+core/cache.py). Тесты, которые писали бы в него, сбрасывали бы кэш
+запущенного рядом сервера, а версии списков и закэшированные страницы
+переживали бы прогон, хотя id в тестовой базе начинаются заново.
+Поэтому на время прогона каждый кэш из CACHES переносится в файл во
+временной папке, а перед каждым тестом очищается: база между тестами
+откатывается, и кэш начинается с пустого так же.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+BACKEND = 'core.cache.SQLiteCache'
+
+
+@contextmanager
+def isolated_caches():
+    """Кэши CACHES в файлах временной папки, которая потом удаляется."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    overridden = override_settings(CACHES={
+        alias: {
+            **options,
+            'BACKEND': BACKEND,
+            'LOCATION': os.path.join(directory, f'{alias}.sqlite3'),
+        }
+        for alias, options in settings.CACHES.items()
+    })
+    overridden.enable()
+    try:
+        yield
+    finally:
+        overridden.disable()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class CacheClearingResult(unittest.TextTestResult):
+    def startTest(self, test):
+        clear_caches()
+        super().startTest(test)
+
+
+class Runner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolated_caches = isolated_caches()
+        self._isolated_caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolated_caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass()
+        if resultclass is None:
+            return CacheClearingResult
+        # --debug-sql: печать запросов сохраняется
+        return type(
+            'CacheClearingResult', (CacheClearingResult, resultclass), {},
+        )
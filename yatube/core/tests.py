@@ -1,4 +1,27 @@
-from django.test import Client, TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.db.utils import ConnectionHandler
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from core import metrics, routers
+from core.cache import SQLiteCache
+from core.management.commands.sync_replicas import copy_database
+from core.ratelimit import parse_rate, take
+from posts.models import Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -18,3 +41,476 @@ class ViewTestClass(TestCase):
         """Передача правильного шаблона для несуществующей страницы."""
         response = self.guest_client.get('/nonexist-page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        options.setdefault('LRU_RESOLUTION', 0)
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'posts': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'posts': [1, 2]})
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expiration(self):
+        """Просроченные значения не отдаются."""
+        self.cache.set('key', 'value', timeout=0.05)
+        self.assertTrue(self.cache.add('other', 'value', timeout=0.05))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('other', 'new value'))
+
+    def test_shared_between_instances(self):
+        """Две копии бэкенда (как два воркера) видят одни данные."""
+        other = self.make_cache()
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_is_atomic(self):
+        """incr() не теряет увеличения при одновременных вызовах."""
+        self.cache.set('version', 1)
+
+        def worker():
+            # у каждого потока свое соединение, как у отдельного процесса
+            for _ in range(50):
+                self.cache.incr('version')
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('version'), 201)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_many(['a', 'c', 'd']), {
+            'a': 'a', 'c': 'c', 'd': 'd',
+        })
+
+    def test_size_cap(self):
+        """Объем кэша не превышает MAX_BYTES."""
+        cache = self.make_cache(MAX_BYTES=10000, CULL_FREQUENCY=2)
+        for i in range(20):
+            cache.set(f'page-{i}', 'x' * 1000)
+        entries, size = cache._db.execute(
+            'SELECT entries, bytes FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertEqual(entries, len(cache.get_many(
+            [f'page-{i}' for i in range(20)]
+        )))
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+    def setUp(self):
+        metrics.registry.clear()
+
+    def metric(self, line):
+        """Значение строки метрики вида 'name{labels}'."""
+        for row in metrics.registry.render().splitlines():
+            if row.startswith(line + ' '):
+                return float(row.split()[-1])
+        return None
+
+    def test_request_is_recorded(self):
+        """Запрос записывается в метрики своего URL."""
+        self.guest_client.get('/')
+        # повторный запрос отдается из кэша списков
+        self.guest_client.get('/')
+
+        view = '{view="posts:index"}'
+        self.assertEqual(
+            self.metric(f'yatube_request_duration_seconds_count{view}'), 2
+        )
+        self.assertGreater(self.metric(f'yatube_db_queries_sum{view}'), 0)
+        self.assertGreater(
+            self.metric(f'yatube_template_render_seconds_sum{view}'), 0
+        )
+        self.assertGreater(self.metric(f'yatube_cache_hits_total{view}'), 0)
+        self.assertGreater(
+            self.metric(f'yatube_cache_misses_total{view}'), 0
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Корзины гистограммы накопительные, как требует Prometheus."""
+        registry = metrics.Registry()
+        for queries in (1, 4, 200):
+            stats = metrics.RequestStats()
+            stats.queries = queries
+            registry.record('posts:index', 0.01, stats)
+        lines = registry.render().splitlines()
+
+        label = 'view="posts:index"'
+        self.assertIn(f'yatube_db_queries_bucket{{{label},le="1"}} 1', lines)
+        self.assertIn(f'yatube_db_queries_bucket{{{label},le="5"}} 2', lines)
+        self.assertIn(
+            f'yatube_db_queries_bucket{{{label},le="100"}} 2', lines
+        )
+        self.assertIn(
+            f'yatube_db_queries_bucket{{{label},le="+Inf"}} 3', lines
+        )
+        self.assertIn(f'yatube_db_queries_sum{{{label}}} 205', lines)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_is_protected(self):
+        """Метрики отдаются только по токену или сотрудникам."""
+        self.assertEqual(self.guest_client.get('/metrics').status_code, 403)
+        response = self.guest_client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.guest_client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram',
+            response.content.decode(),
+        )
+
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client = Client()
+        client.force_login(staff)
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def test_parse_rate(self):
+        """Лимит '10/m' - 10 токенов за минуту."""
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('100/5s'), (100, 5))
+        self.assertEqual(parse_rate('1/d'), (1, 24 * 60 * 60))
+
+    def test_bucket_refills(self):
+        """Корзина отдает емкость сразу и дальше по токену за интервал."""
+        now = time.time()
+        for _ in range(3):
+            self.assertEqual(take('bucket', '3/m', now), 0)
+        self.assertEqual(take('bucket', '3/m', now), 20)
+        # отклоненные запросы токены не тратят
+        self.assertEqual(take('bucket', '3/m', now + 5), 15)
+        self.assertEqual(take('bucket', '3/m', now + 20), 0)
+        self.assertEqual(take('bucket', '3/m', now + 20), 20)
+
+    def test_idle_bucket_does_not_overflow(self):
+        """После простоя доступна емкость корзины, а не больше."""
+        now = time.time()
+        take('bucket', '3/m', now)
+        allowed = [take('bucket', '3/m', now + 600) for _ in range(5)]
+        self.assertEqual(allowed.count(0), 3)
+
+    def test_take_is_atomic(self):
+        """Одновременные запросы получают ровно емкость корзины."""
+        now = time.time()
+        allowed = []
+
+        def worker():
+            for _ in range(20):
+                allowed.append(take('bucket', '50/h', now) == 0)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 50)
+
+    def create_posts(self, count, client=None, **extra):
+        return [
+            (client or self.authorized_client).post(
+                reverse('posts:post_create'), {'text': 'Пост'}, **extra,
+            )
+            for _ in range(count)
+        ]
+
+    def test_post_create_is_limited(self):
+        """Сверх лимита пост не создается, ответ 429 с Retry-After."""
+        responses = self.create_posts(6)
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [302] * 5 + [429],
+        )
+        self.assertEqual(responses[-1]['Retry-After'], '12')
+        self.assertEqual(Post.objects.count(), 5)
+        # форма по GET не ограничивается
+        response = self.authorized_client.get(reverse('posts:post_create'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_limits_per_user_and_ip(self):
+        """Лимит пользователя не мешает другим, лимит IP - общий."""
+        self.create_posts(6)
+        other = User.objects.create_user(username='other')
+        client = Client()
+        client.force_login(other)
+        response, = self.create_posts(1, client)
+        self.assertEqual(response.status_code, 302)
+
+        with override_settings(RATELIMITS={
+            'posts:post_create': {'user': '100/m', 'ip': '2/m'},
+        }):
+            cache.clear()
+            responses = self.create_posts(
+                2, client, REMOTE_ADDR='10.0.0.1',
+            ) + self.create_posts(1, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [302, 302, 429],
+        )
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_can_be_disabled(self):
+        """RATELIMIT_ENABLED = False снимает ограничение."""
+        responses = self.create_posts(6)
+        self.assertEqual(responses[-1].status_code, 302)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.addCleanup(routers.end_request)
+
+    def test_reads_outside_requests_use_primary(self):
+        """Команды и фоновые задачи читают основную базу."""
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_request_reads_replica_until_write(self):
+        """Запрос читает реплику, а после записи - основную базу."""
+        routers.begin_request(pinned=False)
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertTrue(routers.end_request())
+
+    def test_pinned_request_reads_primary(self):
+        """Недавно писавший пользователь читает основную базу."""
+        routers.begin_request(pinned=True)
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertFalse(routers.end_request())
+
+    def test_read_primary(self):
+        """Внутри read_primary() запрос читает основную базу."""
+        routers.begin_request(pinned=False)
+        with routers.read_primary():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+    def test_copy_database(self):
+        """sync_replicas копирует основную базу в файл реплики."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = os.path.join(directory, 'primary.sqlite3')
+        replica = os.path.join(directory, 'replica.sqlite3')
+        with sqlite3.connect(primary) as db:
+            db.execute('CREATE TABLE post (text TEXT)')
+            db.execute("INSERT INTO post VALUES ('Пост')")
+        copy_database(primary, replica)
+        with sqlite3.connect(replica) as db:
+            rows = db.execute('SELECT text FROM post').fetchall()
+        self.assertEqual(rows, [('Пост',)])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=7)
+class ReplicaMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def test_write_pins_user_to_primary(self):
+        """После записи ставится cookie чтения из основной базы."""
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Пост'},
+        )
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 7)
+        self.assertTrue(cookie['httponly'])
+
+    def test_reads_in_transaction_use_primary(self):
+        """В транзакции читается основная база, где видна запись."""
+        routers.begin_request(pinned=False)
+        self.addCleanup(routers.end_request)
+        self.assertEqual(
+            routers.ReplicaRouter().db_for_read(User), 'default',
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class LaggingReplicaTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Старый пост', author=self.author)
+        # реплика - снимок основной базы, дальше она отстает
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'replica.sqlite3')
+        primary = connections['default']
+        primary.ensure_connection()
+        with sqlite3.connect(path) as replica:
+            primary.connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': {'pragmas': {'query_only': 1}},
+        }
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+
+    def test_cached_listing_is_built_from_primary(self):
+        """Закэшированная страница не застревает на отставшей реплике."""
+        guest = Client()
+        self.assertContains(guest.get(reverse('posts:index')), 'Старый пост')
+        # пост увеличивает версию главной, а в реплику еще не попал
+        Post.objects.create(text='Свежий пост', author=self.author)
+        response = guest.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+        # реплика по-прежнему отстает
+        self.assertEqual(
+            Post.objects.using('replica').filter(text='Свежий пост').count(),
+            0,
+        )
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+
+    def make_connection(self, **options):
+        connection = ConnectionHandler({'default': {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': self.path,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': options,
+        }})['default']
+        self.addCleanup(connection.close)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Соединение открывается в WAL, OPTIONS дополняют PRAGMA."""
+        connection = self.make_connection(pragmas={'busy_timeout': 100})
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 100)
+        self.assertEqual(self.pragma(connection, 'cache_size'), -65536)
+        self.assertEqual(self.pragma(connection, 'foreign_keys'), 1)
+
+    def test_foreign_keys_stay_disabled(self):
+        """Выключенные в OPTIONS внешние ключи не включает миграция."""
+        connection = self.make_connection(pragmas={'foreign_keys': 0})
+        connection.enable_constraint_checking()
+        self.assertEqual(self.pragma(connection, 'foreign_keys'), 0)
+
+    def test_readers_do_not_wait_for_writer(self):
+        """Транзакция сразу берет блокировку записи, чтение не ждет."""
+        connection = self.make_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE post (text TEXT)')
+        connection._start_transaction_under_autocommit()
+        self.addCleanup(connection.connection.rollback)
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO post VALUES ('Пост')")
+        self.assertEqual(
+            other.execute('SELECT count(*) FROM post').fetchone(), (0,),
+        )
+
+    def test_connection_is_reused_between_requests(self):
+        connection = self.make_connection()
+        connection.ensure_connection()
+        database = connection.connection
+        connection.close_if_unusable_or_obsolete()
+        connection.ensure_connection()
+        self.assertIs(connection.connection, database)
+
+    def test_health_check_once_per_request(self):
+        connection = self.make_connection()
+        connection.ensure_connection()
+        connection.close_if_unusable_or_obsolete()
+        with mock.patch.object(
+            connection, 'is_usable', return_value=True,
+        ) as is_usable:
+            for _ in range(3):
+                connection.cursor().close()
+        is_usable.assert_called_once()
+
+    def test_reconnects_to_recreated_database(self):
+        """После пересоздания файла базы запрос читает новый файл."""
+        connection = self.make_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE post (text TEXT)')
+        connection.close_if_unusable_or_obsolete()
+        for suffix in ('', '-wal', '-shm'):
+            os.remove(self.path + suffix)
+        with sqlite3.connect(self.path) as db:
+            db.execute('CREATE TABLE post (text TEXT)')
+            db.execute("INSERT INTO post VALUES ('Из копии')")
+        db.close()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT text FROM post')
+            self.assertEqual(cursor.fetchall(), [('Из копии',)])
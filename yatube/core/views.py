@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as request_metrics
 
 
 def page_not_found(request, exception):
@@ -17,3 +23,16 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}',
+    )
+    if not (authorized or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        request_metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
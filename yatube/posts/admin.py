@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Group, Post
+from .search import filter_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +11,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице;
+        # сортировку списка админка задает уже после поиска
+        if not search_term:
+            return queryset, False
+        return filter_posts(search_term, queryset), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("title", "slug", "description")
@@ -0,0 +1,134 @@
+"""
+Кэш страниц со списками постов с инвалидацией по событиям.
+
+У каждого списка (главная, группа, профиль) есть номер версии в кэше.
+Версия входит в ключ закэшированной страницы, поэтому после изменения
+достаточно увеличить версию затронутых списков - старые страницы
+перестают находиться и вытесняются сами. Время жизни кэша можно
+держать большим: устаревших страниц он не отдает.
+
+Версия служит и валидатором для условных запросов: клиент с ETag
+актуальной версии получает 304, не дожидаясь даже чтения страницы
+из кэша. Для Last-Modified рядом с версией хранится время изменения.
+"""
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
+from core import routers
+
+from .conditional import make_etag, viewer
+
+VERSION_KEY = 'listing-version:{}'
+MODIFIED_KEY = 'listing-modified:{}'
+
+
+def get_timeout():
+    return getattr(settings, 'LISTING_CACHE_TIMEOUT', 60 * 60)
+
+
+def listing_scope(name, value=None):
+    if value is None:
+        return name
+    return f'{name}:{value}'
+
+
+def _initial_version():
+    # если ключ версии вытеснили, новая версия все равно больше старых
+    return time.time_ns() // 1000
+
+
+def get_version(scope):
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        # когда список менялся на самом деле, уже неизвестно
+        cache.add(MODIFIED_KEY.format(scope), time.time(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_modified(scope):
+    """Время последнего изменения списка или None."""
+    timestamp = cache.get(MODIFIED_KEY.format(scope))
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def bump(*scopes):
+    """Делает устаревшими закэшированные страницы списков."""
+    for scope in set(scopes):
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+        cache.set(MODIFIED_KEY.format(scope), time.time(), timeout=None)
+
+
+def post_scopes(post, group_ids=()):
+    """Списки, в которых показывается пост."""
+    from .models import Group
+
+    scopes = ['index', listing_scope('profile', post.author.username)]
+    group_ids = {post.group_id, *group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True,
+    )
+    scopes.extend(listing_scope('group', slug) for slug in slugs)
+    return scopes
+
+
+def comment_scopes(post):
+    """
+    Списки, где число комментариев поста нужно обновить сразу. Главная
+    не сбрасывается: при потоке комментариев она не держалась бы
+    в кэше, поэтому число на ней отстает до нового поста или до
+    истечения LISTING_CACHE_TIMEOUT.
+    """
+    return [scope for scope in post_scopes(post) if scope != 'index']
+
+
+def cache_listing(name, kwarg=None):
+    """
+    Кэширует страницу списка в версии, актуальной на момент запроса.
+    kwarg - аргумент представления, который выделяет конкретный список.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scope = listing_scope(name, kwargs.get(kwarg))
+            version = get_version(scope)
+            # страница зависит от зрителя. Vary: Cookie добавляет
+            # SessionMiddleware уже после cache_page, и ключ по всему
+            # Cookie дробил бы кэш гостей, поэтому зритель - в ключе
+            key_prefix = f'listing:{scope}:{version}:{viewer(request)}'
+            cached_view = cache_page(get_timeout(), key_prefix=key_prefix)
+
+            def etag(request, *args, **kwargs):
+                return make_etag(
+                    scope, version, request.get_full_path(), viewer(request),
+                )
+
+            def last_modified(request, *args, **kwargs):
+                if request.user.is_authenticated:
+                    return None
+                return get_modified(scope)
+
+            conditional_view = condition(etag, last_modified)
+            # страница ложится в кэш под новой версией надолго;
+            # построенная по отстающей реплике, она все это время
+            # показывала бы список без последних изменений
+            with routers.read_primary():
+                return conditional_view(cached_view(view))(
+                    request, *args, **kwargs
+                )
+        return wrapper
+    return decorator
@@ -0,0 +1,78 @@
+"""
+Условные GET-запросы (ETag и Last-Modified) для страниц чтения.
+
+Валидатор страницы вычисляется раньше самой страницы: если у клиента
+уже актуальная версия, он получает 304 без запросов за постами и без
+отрисовки шаблона. Для списков валидатор - версия списка в кэше
+(см. caching.py), для страницы поста - один запрос по первичному ключу
+поста и индексу комментариев (post, created). С шардами запрос идет
+в шард поста, а автор и группа входят в ETag своими id: JOIN с
+основной базой невозможен.
+
+Страница зависит от зрителя (ссылка на редактирование, форма
+комментария, подписка), поэтому зритель входит в ETag. Last-Modified
+отдается только анонимам: дата не различает зрителей, а краулеры
+и опрашивающие клиенты приходят без входа.
+"""
+import hashlib
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import sharding
+from .models import Comment, Post
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def viewer(request):
+    """Ключ зрителя для ETag: id пользователя или None для гостя."""
+    return request.user.pk if request.user.is_authenticated else None
+
+
+def post_state(request, post_id):
+    """
+    Все, от чего зависит страница поста, одним запросом: дата правки,
+    число и дата последнего комментария, автор и группа. Запоминается
+    на запросе, чтобы ETag и Last-Modified не читали базу дважды.
+    """
+    if not hasattr(request, '_post_state'):
+        fields = ('author__username', 'group__slug', 'group__title')
+        posts = Post.objects.filter(pk=post_id)
+        comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+        if sharding.get_shards():
+            fields = ('author_id', 'group_id')
+            posts = posts.using(sharding.shard_of_post(post_id))
+        request._post_state = posts.annotate(
+            comment_count=Coalesce(Subquery(
+                comments.values('post').annotate(
+                    count=Count('pk'),
+                ).values('count'),
+                output_field=IntegerField(),
+            ), 0),
+            last_comment=Subquery(
+                comments.order_by('-created').values('created')[:1],
+            ),
+        ).values(
+            'updated', 'comment_count', 'last_comment', *fields,
+        ).first()
+    return request._post_state
+
+
+def post_etag(request, post_id):
+    state = post_state(request, post_id)
+    if state is None:
+        # несуществующий пост - ответит само представление
+        return None
+    return make_etag(post_id, viewer(request), *state.values())
+
+
+def post_last_modified(request, post_id):
+    state = post_state(request, post_id)
+    if state is None or request.user.is_authenticated:
+        return None
+    return max(filter(None, (state['updated'], state['last_comment'])))
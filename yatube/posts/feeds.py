@@ -0,0 +1,89 @@
+"""
+RSS и Atom ленты постов группы и автора.
+
+Ленты опрашивают каждые несколько минут, поэтому они закэшированы так
+же, как страницы списков (caching.cache_listing): кэш сбрасывается
+сменой версии списка при создании и правке постов, а опрос без
+изменений получает 304 по ETag или Last-Modified.
+"""
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.template.defaultfilters import linebreaks, truncatechars
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from .models import Group, User
+
+# сколько последних постов отдавать в ленте
+FEED_LENGTH = 20
+
+
+class PostsFeed(Feed):
+    def __call__(self, request, *args, **kwargs):
+        response = super().__call__(request, *args, **kwargs)
+        # Last-Modified выставит cache_listing по времени изменения
+        # списка: дата последнего поста не учитывает правки
+        del response['Last-Modified']
+        return response
+
+    def item_title(self, post):
+        return truncatechars(post.text, 60)
+
+    def item_description(self, post):
+        return linebreaks(post.text)
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', kwargs={'post_id': post.pk})
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_updateddate(self, post):
+        return post.updated
+
+    def item_author_name(self, post):
+        return post.author.username
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'{group.title} | Yatube'
+
+    def link(self, group):
+        return reverse('posts:group_list', kwargs={'slug': group.slug})
+
+    def description(self, group):
+        return group.description
+
+    def items(self, group):
+        return group.posts.select_related('author')[:FEED_LENGTH]
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+    subtitle = GroupFeed.description
+
+
+class ProfileFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Записи {author.username} | Yatube'
+
+    def link(self, author):
+        return reverse('posts:profile', kwargs={'username': author.username})
+
+    def description(self, author):
+        return f'Последние записи пользователя {author.username}'
+
+    def items(self, author):
+        return author.posts.select_related('author')[:FEED_LENGTH]
+
+
+class ProfileAtomFeed(ProfileFeed):
+    feed_type = Atom1Feed
+    subtitle = ProfileFeed.description
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import INGEST_ERRORS, IngestedImage, ingest
 from .models import Comment, Post
 
 
@@ -13,6 +15,32 @@ class PostForm(forms.ModelForm):
             'image': 'Изображение',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # уже сохраненная картинка приходит как FieldFile
+        if isinstance(image, UploadedFile):
+            try:
+                return ingest(image)
+            except INGEST_ERRORS:
+                raise forms.ValidationError(
+                    'Не удалось обработать картинку: файл поврежден '
+                    'или слишком велик.',
+                    code='invalid_image',
+                )
+        return image
+
+    def save(self, commit=True):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, IngestedImage):
+            self.instance.image_width = image.width
+            self.instance.image_height = image.height
+            self.instance.image_size = image.size
+        elif not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            self.instance.image_size = None
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
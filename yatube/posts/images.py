@@ -0,0 +1,82 @@
+"""
+Обработка загруженных картинок постов.
+
+Телефоны присылают снимки по 10-20 Мб, а на сайте картинка не бывает
+больше IMAGE_MAX_SIZE точек по длинной стороне. Поэтому при загрузке
+картинка уменьшается, EXIF (геометки, модель камеры) удаляется,
+а результат пересохраняется в progressive JPEG или, если есть
+прозрачность, в WebP.
+
+Память ограничена: JPEG декодируется в режиме draft сразу в уменьшенном
+масштабе (1/2, 1/4 или 1/8), крупные загрузки Django держит на диске,
+а результат пишется во временный файл, который остается в памяти,
+только пока он небольшой. Остальные форматы draft не уменьшает, поэтому
+картинка больше IMAGE_MAX_PIXELS точек не декодируется вовсе.
+
+Поврежденный файл или «бомба» со сжатыми гигапикселями дают OSError,
+Image.DecompressionBombError или ValueError - форма показывает их как
+ошибку поля (INGEST_ERRORS).
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps
+
+# сколько байт результата держать в памяти до сброса на диск
+SPOOL_SIZE = 1024 * 1024
+# ошибки разбора и декодирования загруженной картинки
+INGEST_ERRORS = (OSError, Image.DecompressionBombError, ValueError)
+
+
+class IngestedImage(File):
+    """Обработанная картинка с размерами для записи в пост."""
+
+    def __init__(self, file, name, width, height):
+        super().__init__(file, name)
+        self.width = width
+        self.height = height
+
+
+def ingest(upload):
+    """Уменьшает, очищает от метаданных и пересохраняет картинку."""
+    max_size = settings.IMAGE_MAX_SIZE
+    upload.seek(0)
+    image = Image.open(upload)
+    ratio = max_size / max(image.size)
+    if ratio < 1:
+        # JPEG декодер сразу уменьшает картинку кратно, но не меньше
+        # запрошенного размера; размер нужен с пропорциями картинки
+        image.draft('RGB', tuple(round(side * ratio) for side in image.size))
+    # после draft размер JPEG уже уменьшен, остальные декодируются целиком
+    if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+        raise ValueError(f'Слишком большая картинка: {image.size}')
+    # поворот из EXIF применяем, прежде чем EXIF потерять
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if _has_alpha(image):
+        image = image.convert('RGBA')
+        extension, options['format'] = 'webp', 'WEBP'
+        options['quality'] = settings.IMAGE_QUALITY
+    else:
+        image = image.convert('RGB')
+        extension, options['format'] = 'jpg', 'JPEG'
+        options.update(
+            quality=settings.IMAGE_QUALITY, progressive=True, optimize=True,
+        )
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    # exif не передаем - в новый файл он не попадет
+    image.save(output, **options)
+    output.seek(0)
+    name = f'{os.path.splitext(os.path.basename(upload.name))[0]}.{extension}'
+    return IngestedImage(output, name, *image.size)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
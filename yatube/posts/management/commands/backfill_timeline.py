@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = 'Заполняет материализованные ленты подписок по текущим данным'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help='Пересобрать ленту только для указанного пользователя',
+        )
+
+    def handle(self, *args, **options):
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        else:
+            # ленты есть только у тех, кто на кого-то подписан
+            users = User.objects.filter(
+                pk__in=Follow.objects.values('user_id'),
+            )
+        user_ids = users.values_list('pk', flat=True).iterator()
+        count = 0
+        for user_id in user_ids:
+            with transaction.atomic():
+                timeline.rebuild(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {count}'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «на кого подписаться» по графу подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=recommendations.TOP_K,
+            help='Сколько рекомендаций хранить для пользователя',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=recommendations.BATCH_USERS,
+            help='Сколько пользователей считать за одно умножение матриц',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # расчет идет вне транзакции, а замена строк - в короткой
+        count = recommendations.rebuild(
+            options['count'], options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано рекомендаций: {count} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов и его триггеры'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.install()
+            search.rebuild()
+        count = Post.objects.count()
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {count}')
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики подписчиков, подписок, постов '
+        'и комментариев'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = stats.reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано пользователей: {count}')
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги раздела «В тренде» по счетчикам событий'
+
+    def handle(self, *args, **options):
+        trending.refresh()
+        self.stdout.write(self.style.SUCCESS('Рейтинги обновлены'))
@@ -0,0 +1,368 @@
+"""
+Заполнение базы синтетическими данными для тестов и нагрузочных замеров.
+
+Объекты создаются через bulk_create пачками, каждая пачка - в своей
+транзакции. Первичные ключи и даты назначаются заранее, поэтому ленты
+подписок собираются в памяти, без запроса к базе на каждого
+пользователя, а счетчики пересчитываются одним проходом reconcile().
+
+Популярность распределена по степенному закону: немногие авторы
+пишут большую часть постов и собирают большую часть подписчиков,
+немногие посты собирают большую часть комментариев.
+"""
+import heapq
+import math
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from posts import caching, stats, timeline
+from posts.images import ingest
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+
+# показатель закона Zipf: k-й по популярности выбирается с частотой
+# пропорциональной 1 / k ** ZIPF_EXPONENT
+ZIPF_EXPONENT = 1.2
+# показатель распределения Парето для числа подписок пользователя
+FOLLOWING_SHAPE = 1.5
+
+WORDS = (
+    'кот собака дом лето зима город река лес море книга музыка кино '
+    'работа отпуск утро вечер дорога поезд друг семья сад кофе чай '
+    'дождь солнце горы снег весна осень театр выставка парк мост'
+).split()
+
+
+class PowerLaw:
+    """
+    Случайные номера от 0 до count - 1 с частотами по закону Zipf.
+    Номера переставлены, чтобы популярность не совпадала с порядком
+    создания; список весов не хранится, поэтому count может быть
+    любым.
+    """
+
+    def __init__(self, rng, count):
+        self.rng = rng
+        self.count = count
+        # ранг из распределения Парето с плотностью ~ x ** -ZIPF_EXPONENT
+        self.shape = ZIPF_EXPONENT - 1
+        self.step = rng.randrange(1, count) if count > 1 else 1
+        while math.gcd(self.step, count) != 1:
+            self.step += 1
+        self.offset = rng.randrange(count)
+
+    def __call__(self):
+        rank = int(self.rng.paretovariate(self.shape)) - 1
+        while rank >= self.count:
+            rank = int(self.rng.paretovariate(self.shape)) - 1
+        return (rank * self.step + self.offset) % self.count
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now и auto_now_add, чтобы сохранить свои даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def next_pk(model):
+    return (model.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями, постами и подписками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой, от 0 до 1',
+        )
+        parser.add_argument(
+            '--image-pool', type=int, default=20,
+            help='Сколько разных картинок сгенерировать',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты',
+        )
+        parser.add_argument(
+            '--timeline-length', type=int,
+            help='Сколько постов положить в каждую ленту подписок; '
+                 'по умолчанию TIMELINE_MAX_LENGTH',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+
+        self.step('пользователи', self.create_users)
+        self.step('группы', self.create_groups)
+        self.step('посты', self.create_posts)
+        self.step('подписки', self.create_follows)
+        self.step('комментарии', self.create_comments)
+        self.step('ленты', self.create_timelines)
+        self.step('счетчики', stats.reconcile)
+        # закэшированная главная страница не знает о новых постах
+        caching.bump('index')
+
+    def step(self, title, function):
+        started = time.perf_counter()
+        count = function()
+        self.stdout.write(
+            f'{title}: {count} за {time.perf_counter() - started:.1f} с'
+        )
+
+    def batches(self, items):
+        while True:
+            batch = list(islice(items, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def create(self, model, objects):
+        """Сохраняет объекты пачками, каждую в своей транзакции."""
+        count = 0
+        for batch in self.batches(objects):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            count += len(batch)
+        return count
+
+    def sentence(self, words):
+        return ' '.join(
+            self.rng.choices(WORDS, k=self.rng.randint(3, words))
+        )
+
+    def create_users(self):
+        self.first_user = next_pk(User)
+        self.user_count = self.options['users']
+        # кто много пишет, на того больше и подписываются
+        self.popularity = PowerLaw(self.rng, self.user_count)
+        # хеш пароля дорогой - один на всех, пароль «password»
+        password = make_password('password')
+        return self.create(User, (
+            User(
+                pk=self.first_user + number,
+                username=f'user{self.first_user + number}',
+                password=password,
+            )
+            for number in range(self.user_count)
+        ))
+
+    def create_groups(self):
+        first = next_pk(Group)
+        self.group_ids = [first + n for n in range(self.options['groups'])]
+        return self.create(Group, (
+            Group(
+                pk=pk, title=f'Группа {pk}', slug=f'group-{pk}',
+                description=self.sentence(20),
+            )
+            for pk in self.group_ids
+        ))
+
+    def post_date(self, number):
+        # даты постов растут вместе с ключами
+        return self.start + (self.now - self.start) * (
+            number / self.options['posts']
+        )
+
+    def create_posts(self):
+        self.first_post = next_pk(Post)
+        images = self.create_images()
+        # автор каждого поста и посты каждого автора по возрастанию ключа
+        self.post_authors = array('l')
+        self.author_posts = {}
+
+        def posts():
+            for number in range(self.options['posts']):
+                pk = self.first_post + number
+                author_id = self.first_user + self.popularity()
+                self.post_authors.append(author_id)
+                self.author_posts.setdefault(author_id, array('l')).append(pk)
+                pub_date = self.post_date(number)
+                post = Post(
+                    pk=pk, text=self.sentence(40), author_id=author_id,
+                    pub_date=pub_date, updated=pub_date,
+                )
+                if self.group_ids and self.rng.random() < 0.5:
+                    post.group_id = self.rng.choice(self.group_ids)
+                if images and self.rng.random() < self.options['images']:
+                    image = self.rng.choice(images)
+                    post.image = image['name']
+                    post.image_width = image['width']
+                    post.image_height = image['height']
+                    post.image_size = image['size']
+                yield post
+
+        with explicit_dates(
+            Post._meta.get_field('pub_date'), Post._meta.get_field('updated'),
+        ):
+            return self.create(Post, posts())
+
+    def create_images(self):
+        """Картинки в хранилище, пропущенные через обычную обработку."""
+        if not self.options['images']:
+            return []
+        images = []
+        for number in range(self.options['image_pool']):
+            source = Image.new('RGB', (1600, 1200), self.color())
+            draw = ImageDraw.Draw(source)
+            for _ in range(12):
+                x, y = self.rng.randrange(1600), self.rng.randrange(1200)
+                radius = self.rng.randrange(50, 400)
+                draw.ellipse(
+                    (x - radius, y - radius, x + radius, y + radius),
+                    fill=self.color(),
+                )
+            buffer = BytesIO()
+            source.save(buffer, 'JPEG', quality=95)
+            image = ingest(File(buffer, f'seed{number}.jpg'))
+            name = default_storage.save(f'posts/{image.name}', image)
+            images.append({
+                'name': name, 'width': image.width,
+                'height': image.height, 'size': image.size,
+            })
+        return images
+
+    def color(self):
+        return tuple(self.rng.randrange(256) for _ in range(3))
+
+    def create_follows(self):
+        # среднее значение paretovariate(shape) - shape / (shape - 1)
+        scale = self.options['follows'] * (FOLLOWING_SHAPE - 1) / (
+            FOLLOWING_SHAPE
+        )
+        self.following = {}
+
+        def follows():
+            for number in range(self.user_count):
+                user_id = self.first_user + number
+                count = min(
+                    int(self.rng.paretovariate(FOLLOWING_SHAPE) * scale),
+                    self.user_count - 1,
+                )
+                author_ids = set()
+                # популярные авторы выпадают повторно - попыток с запасом
+                for _ in range(count * 3):
+                    if len(author_ids) == count:
+                        break
+                    author_id = self.first_user + self.popularity()
+                    if author_id != user_id:
+                        author_ids.add(author_id)
+                if author_ids:
+                    self.following[user_id] = author_ids
+                for author_id in sorted(author_ids):
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        return self.create(Follow, follows())
+
+    def create_comments(self):
+        if not self.options['posts']:
+            return 0
+        post = PowerLaw(self.rng, self.options['posts'])
+
+        def comments():
+            for _ in range(self.options['comments']):
+                number = post()
+                # комментарий пишут после поста
+                post_date = self.post_date(number)
+                created = post_date + (self.now - post_date) * (
+                    self.rng.random() ** 4
+                )
+                yield Comment(
+                    post_id=self.first_post + number,
+                    author_id=self.first_user + self.rng.randrange(
+                        self.user_count
+                    ),
+                    text=self.sentence(15),
+                    created=created,
+                )
+
+        field = Comment._meta.get_field('created')
+        with explicit_dates(field):
+            return self.create(Comment, comments())
+
+    def create_timelines(self):
+        """
+        То же, что timeline.rebuild() для каждого подписчика: последние
+        TIMELINE_MAX_LENGTH постов его авторов. Ключи постов растут
+        вместе с датой, поэтому ленты сливаются из списков по авторам.
+
+        Записей в лентах на порядки больше, чем постов, а подготовка
+        модели в bulk_create обходится дороже самой вставки, поэтому
+        строки вставляются через executemany().
+        """
+        max_length = (
+            self.options['timeline_length'] or timeline.get_max_length()
+        )
+
+        # свежие посты попадают в тысячи лент, дату для базы
+        # форматируем один раз
+        @lru_cache(maxsize=100000)
+        def pub_date(number):
+            return connection.ops.adapt_datetimefield_value(
+                self.post_date(number)
+            )
+
+        sql = (
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) VALUES (%s, %s, %s, %s)'
+        )
+
+        def entries():
+            for user_id, author_ids in self.following.items():
+                for post_id in islice(heapq.merge(
+                    *(
+                        reversed(self.author_posts[author_id])
+                        for author_id in author_ids
+                        if author_id in self.author_posts
+                    ),
+                    reverse=True,
+                ), max_length):
+                    number = post_id - self.first_post
+                    yield (
+                        user_id, post_id, self.post_authors[number],
+                        pub_date(number),
+                    )
+
+        count = 0
+        for batch in self.batches(entries()):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            count += len(batch)
+        return count
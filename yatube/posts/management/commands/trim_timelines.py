@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Обрезает ленты подписок до TIMELINE_MAX_LENGTH последних записей'
+
+    def handle(self, *args, **options):
+        count = timeline.trim()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {count}'))
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def count_by(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(count=Count('pk')).order_by()
+    )
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    followers = count_by(Follow.objects.all(), 'author_id')
+    following = count_by(Follow.objects.all(), 'user_id')
+    posts = count_by(Post.objects.all(), 'author_id')
+    comments = count_by(Comment.objects.all(), 'author_id')
+    UserStats.objects.bulk_create(
+        [
+            UserStats(
+                user_id=user_id,
+                followers=followers.get(user_id, 0),
+                following=following.get(user_id, 0),
+                posts=posts.get(user_id, 0),
+                comments=comments.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list('pk', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_auto_20261018_0538'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('following', models.PositiveIntegerField(default=0)),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F, Min
+
+
+def remove_follows_without_author(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    orphans = Follow.objects.filter(author__isnull=True).values(
+        'user_id',
+    ).annotate(count=Count('pk')).order_by()
+    for item in orphans:
+        # такие подписки тоже попали в счетчики предыдущей миграцией
+        UserStats.objects.filter(user_id=item['user_id']).update(
+            following=F('following') - item['count'],
+        )
+    Follow.objects.filter(author__isnull=True).delete()
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    duplicates = Follow.objects.values('user_id', 'author_id').annotate(
+        count=Count('pk'), keep=Min('pk'),
+    ).filter(count__gt=1).order_by()
+    for item in duplicates:
+        Follow.objects.filter(
+            user_id=item['user_id'], author_id=item['author_id'],
+        ).exclude(pk=item['keep']).delete()
+        # счетчики заполнены предыдущей миграцией вместе с дублями
+        extra = item['count'] - 1
+        UserStats.objects.filter(user_id=item['user_id']).update(
+            following=F('following') - extra,
+        )
+        UserStats.objects.filter(user_id=item['author_id']).update(
+            followers=F('followers') - extra,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_userstats'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timelineentry',
+            options={'ordering': ['-pub_date', '-post_id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date'], name='post_group_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'pub_date', 'post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_follows_without_author, migrations.RunPython.noop,
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:45
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_updated(apps, schema_editor):
+    # существующие посты не менялись с момента публикации
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_auto_20261018_0543'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(set_updated, migrations.RunPython.noop),
+    ]
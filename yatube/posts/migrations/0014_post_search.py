@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:58
+
+from django.db import migrations
+
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    # индекс по уже существующим постам
+    "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
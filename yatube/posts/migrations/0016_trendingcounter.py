@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('group', 'Группа')], max_length=5)),
+                ('object_id', models.PositiveIntegerField()),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('bucket', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trendingcounter',
+            index=models.Index(fields=['kind', 'bucket'], name='trending_kind_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trendingcounter',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'slot'), name='unique_trending_slot'),
+        ),
+    ]
@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from core.models import PubDateModel
 
@@ -17,6 +20,69 @@ class Group(models.Model):
         return self.title
 
 
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # QuerySet.create() сохраняет в базу запроса, выбранную без
+        # объекта; без явного using шард выбирает роутер по объекту
+        if self._db is None and getattr(settings, 'POST_SHARDS', []):
+            obj = self.model(**kwargs)
+            obj.save(force_insert=True)
+            return obj
+        return super().create(**kwargs)
+
+
+class PostQuerySet(ShardedQuerySet):
+    # поля, которые нужны карточке поста includes/single_post.html
+    SHARD_CARD_FIELDS = (
+        'id', 'text', 'pub_date', 'updated', 'image', 'author', 'group',
+    )
+    CARD_FIELDS = SHARD_CARD_FIELDS + (
+        'author__username', 'group__title', 'group__slug',
+    )
+
+    def for_cards(self):
+        """
+        Посты для списков: автор и группа приходят одним запросом,
+        ненужные карточке колонки не читаются, число комментариев
+        считается подзапросом только для строк текущей страницы.
+        """
+        return self.select_related('author', 'group').only(
+            *self.CARD_FIELDS
+        ).with_comment_count()
+
+    def for_shard_cards(self):
+        """
+        Посты для списков из шарда (posts/sharding.py): авторов и группы
+        из основной базы подставляет sharding.attach_related().
+        """
+        return self.only(*self.SHARD_CARD_FIELDS).with_comment_count()
+
+    def with_comment_count(self):
+        comments = Comment.objects.filter(
+            post=OuterRef('pk'),
+        ).order_by().values('post').annotate(
+            count=Count('pk'),
+        ).values('count')
+        return self.annotate(
+            comment_count=Coalesce(
+                Subquery(comments, output_field=IntegerField()), 0
+            ),
+        )
+
+    def in_timeline(self, user):
+        """
+        Посты авторов, на которых подписан пользователь, от новых
+        к старым; лента материализована в TimelineEntry и читается
+        по индексу.
+        """
+        return self.filter(timeline_entries__user=user).order_by(
+            # F() не подтягивает сортировку связанной модели Post,
+            # поэтому порядок целиком берется из индекса ленты
+            F('timeline_entries__pub_date').desc(),
+            F('timeline_entries__post').desc(),
+        )
+
+
 class Post(PubDateModel):
     text = models.TextField()
     pub_date = models.DateTimeField("date published", auto_now_add=True)
@@ -27,6 +93,38 @@ class Post(PubDateModel):
         Group, models.SET_NULL, blank=True, null=True, related_name="posts",
     )
     image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    # заполняются при загрузке через PostForm, см. posts/images.py
+    image_width = models.PositiveIntegerField(
+        "Ширина картинки", null=True, blank=True, editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        "Высота картинки", null=True, blank=True, editable=False,
+    )
+    image_size = models.PositiveIntegerField(
+        "Размер картинки, байт", null=True, blank=True, editable=False,
+    )
+    # версия поста для кэша карточки
+    updated = models.DateTimeField("Дата изменения", auto_now=True)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta(PubDateModel.Meta):
+        indexes = [
+            # индексы по возрастанию: SQLite читает их с конца, а id
+            # (rowid) в конце индекса дает порядок (-pub_date, -id)
+            # без временной сортировки
+            models.Index(
+                fields=["pub_date"], name="post_pub_date_idx",
+            ),
+            models.Index(
+                fields=["author", "pub_date"],
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["group", "pub_date"],
+                name="post_group_pub_date_idx",
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -39,8 +137,16 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField("date published", auto_now_add=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(
+                fields=["post", "created"],
+                name="comment_post_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -53,6 +159,150 @@ class Follow(models.Model):
     )
     # ссылка на объект пользователя, на которого подписываются
     author = models.ForeignKey(
-        User, related_name="following", blank=True, null=True,
-        on_delete=models.CASCADE,
+        User, related_name="following", on_delete=models.CASCADE,
     )
+
+    class Meta:
+        constraints = [
+            # уникальный индекс заодно обслуживает поиск подписки
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_follow",
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок.
+    Для каждого подписчика хранит ссылку на пост автора, чтобы лента
+    читалась одним проходом по индексу (user, -pub_date).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries",
+    )
+    # денормализованные поля: автор - для отписки,
+    # дата - для сортировки без обращения к таблице постов
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+",
+    )
+    pub_date = models.DateTimeField("date published")
+
+    class Meta:
+        ordering = ["-pub_date", "-post_id"]
+        indexes = [
+            # индексы по возрастанию: SQLite читает их с конца,
+            # и порядок DESC по обоим ключам получается без сортировки
+            models.Index(
+                fields=["user", "pub_date", "post"],
+                name="timeline_user_pub_date_idx",
+            ),
+            models.Index(
+                fields=["user", "author"],
+                name="timeline_user_author_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry",
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """
+    Счетчики пользователя для карточки профиля.
+    Поддерживаются сигналами при подписке, отписке, создании
+    и удалении постов и комментариев.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name="stats",
+    )
+    # на пользователя подписаны
+    followers = models.PositiveIntegerField(default=0)
+    # пользователь подписан
+    following = models.PositiveIntegerField(default=0)
+    posts = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class Recommendation(models.Model):
+    """
+    Рекомендации «на кого подписаться», посчитанные пакетно командой
+    build_recommendations. Для пользователя хранятся лучшие кандидаты
+    по порядку, и блок рекомендаций читается по индексу (user, rank).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="recommendations",
+    )
+    candidate = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+",
+    )
+    # место в списке рекомендаций пользователя, с нуля
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    # сколько авторов из подписок пользователя читают кандидата
+    mutual = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["rank"]
+        constraints = [
+            # уникальный индекс заодно обслуживает чтение рекомендаций
+            models.UniqueConstraint(
+                fields=["user", "rank"], name="unique_recommendation_rank",
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.candidate_id}'
+
+
+class TrendingCounter(models.Model):
+    """
+    Счетчики событий для раздела «В тренде» по интервалам времени.
+    У объекта не больше trending.BUCKETS строк: интервал пишется
+    в ячейку bucket % BUCKETS и затирает счетчик давно прошедшего
+    интервала, как в кольцевом буфере.
+    """
+    # комментарии к посту
+    POST = "post"
+    # новые посты в группе
+    GROUP = "group"
+    KINDS = [(POST, "Пост"), (GROUP, "Группа")]
+
+    kind = models.CharField(max_length=5, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    # группа поста, чтобы выбирать тренды группы без таблицы постов
+    group = models.ForeignKey(
+        Group, on_delete=models.CASCADE, blank=True, null=True,
+        related_name="+",
+    )
+    slot = models.PositiveSmallIntegerField()
+    # номер интервала: время события, деленное на длину интервала
+    bucket = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["kind", "bucket"], name="trending_kind_bucket_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "slot"],
+                name="unique_trending_slot",
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}: {self.count}'
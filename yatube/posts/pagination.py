@@ -0,0 +1,135 @@
+"""
+Пагинация лент постов и комментариев.
+
+Первые страницы доступны по номеру (?page=N), дальше лента листается
+курсором (?after=<токен>) по ключу (pub_date, id): без COUNT(*) по всей
+таблице и без OFFSET, поэтому глубокие страницы не медленнее первой.
+Комментарии листаются только курсором, по ключу (created, id).
+"""
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERING = ('-created', '-pk')
+
+
+def encode_token(*values):
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Значения из токена строками; ValueError, если токен испорчен."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    except (binascii.Error, UnicodeError) as error:
+        raise ValueError(token) from error
+
+
+def encode_cursor(post):
+    return encode_token(post.pub_date.isoformat(), post.pk)
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, pk) или None, если токен испорчен."""
+    try:
+        pub_date, pk = decode_token(token)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except ValueError:
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинатор с ограниченным счетчиком и курсорными страницами.
+
+    Считается не больше offset_pages страниц, остальное листается
+    через page_after(). У каждой страницы есть атрибут next_cursor -
+    токен для ссылки на следующую страницу или None.
+    """
+
+    # порядок страниц; по его полям строится курсор
+    ordering = ORDERING
+
+    def __init__(self, object_list, per_page, offset_pages=5):
+        if not object_list.query.order_by:
+            object_list = object_list.order_by(*self.ordering)
+        super().__init__(object_list, per_page)
+        self.offset_pages = offset_pages
+        self.truncated = False
+
+    @cached_property
+    def count(self):
+        # вместо COUNT(*) по всей таблице читаются только id постов,
+        # помещающихся на номерные страницы
+        limit = self.offset_pages * self.per_page
+        count = len(
+            self.object_list.values_list('pk', flat=True)[:limit + 1]
+        )
+        self.truncated = count > limit
+        return min(count, limit)
+
+    def _get_page(self, object_list, number, paginator):
+        page = Page(object_list, number, paginator)
+        page.next_cursor = None
+        if number < self.num_pages:
+            return page
+        if self.truncated and len(page):
+            page.next_cursor = self.get_cursor(page[len(page) - 1])
+        return page
+
+    def get_cursor(self, post):
+        """Токен курсора, указывающий на пост."""
+        return encode_cursor(post)
+
+    def filter_after(self, token):
+        """Условие на посты после курсора или None, если токен испорчен."""
+        cursor = decode_cursor(token)
+        if cursor is None:
+            return None
+        pub_date, pk = cursor
+        return Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+
+    def page_after(self, token):
+        """Страница постов, идущих после курсора."""
+        after = self.filter_after(token or '')
+        if after is None:
+            return self.get_page(1)
+        posts = list(self.object_list.filter(after)[:self.per_page + 1])
+        page = Page(posts[:self.per_page], None, self)
+        page.next_cursor = None
+        if len(posts) > self.per_page:
+            page.next_cursor = self.get_cursor(posts[self.per_page - 1])
+        return page
+
+
+def comment_page(comments, per_page, after=None):
+    """
+    Порция комментариев от новых к старым и курсор следующей порции
+    или None. after - курсор из предыдущей порции; с испорченным
+    курсором возвращается первая порция.
+    """
+    comments = comments.order_by(*COMMENT_ORDERING)
+    cursor = decode_cursor(after) if after else None
+    if cursor is not None:
+        created, pk = cursor
+        comments = comments.filter(
+            Q(created__lt=created) | Q(created=created, pk__lt=pk)
+        )
+    # лишний комментарий показывает, есть ли следующая порция
+    batch = list(comments[:per_page + 1])
+    next_cursor = None
+    if len(batch) > per_page:
+        last = batch[per_page - 1]
+        next_cursor = encode_token(last.created.isoformat(), last.pk)
+    return batch[:per_page], next_cursor
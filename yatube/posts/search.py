@@ -0,0 +1,124 @@
+"""
+Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_fts - FTS5-таблица с внешним содержимым (content=):
+текст постов в ней второй раз не хранится, а синхронизируется
+триггерами на posts_post, поэтому изменения через update() или
+bulk_create() тоже попадают в индекс. Результаты ранжируются по BM25.
+
+Миграции SQLite пересоздают posts_post при изменении схемы, и триггеры
+при этом пропадают; install() возвращает их после каждого migrate.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .pagination import CursorPaginator, decode_token, encode_token
+
+TABLE = 'posts_post_fts'
+
+SCHEMA = (
+    # unicode61 без учета регистра и диакритики: «ё» находится по «е»
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+# больше слов в запросе не учитываем
+MAX_TERMS = 10
+
+
+def install(using=connection):
+    """Создает индекс и триггеры, если их нет."""
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def rebuild(using=connection):
+    """Заново строит индекс по всем постам и уплотняет его."""
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def match_expression(query):
+    """
+    Запрос FTS5 из пользовательского ввода: все слова должны найтись,
+    каждое - как начало слова («кот» находит и «котенка»). Синтаксис
+    FTS5 из ввода не используется, поэтому запрос всегда корректен.
+    """
+    words = re.findall(r'\w+', query)[:MAX_TERMS]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def filter_posts(query, posts):
+    """Посты из posts, подходящие под запрос, без ранжирования."""
+    expression = match_expression(query)
+    if not expression:
+        return posts.none()
+    return posts.extra(
+        tables=[TABLE],
+        where=[
+            # «+» не дает SQLite искать в индексе по rowid из posts_post:
+            # bm25() работает, только когда индекс читается по MATCH
+            f'+{TABLE}.rowid = posts_post.id',
+            f'{TABLE} MATCH %s',
+        ],
+        params=[expression],
+    )
+
+
+def search_posts(query, posts):
+    """
+    Посты из posts, подходящие под запрос, от более релевантных к менее.
+    У каждого поста есть rank - оценка BM25 (чем меньше, тем лучше).
+    bm25() нельзя вычислить в подзапросе, поэтому count() у результата
+    не работает - число результатов считается по values_list('pk').
+    """
+    return filter_posts(query, posts).annotate(
+        rank=RawSQL(f'bm25({TABLE})', ()),
+    ).order_by('rank', 'pk')
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по ключу (rank, id)."""
+    ordering = ('rank', 'pk')
+
+    def get_cursor(self, post):
+        # repr() восстанавливает float без потери точности
+        return encode_token(repr(post.rank), post.pk)
+
+    def filter_after(self, token):
+        try:
+            rank, pk = decode_token(token)
+            rank, pk = float(rank), int(pk)
+        except ValueError:
+            return None
+        return Q(rank__gt=rank) | Q(rank=rank, pk__gt=pk)
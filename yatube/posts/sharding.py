@@ -0,0 +1,237 @@
+"""
+Шардирование постов и комментариев по автору.
+
+POST_SHARDS - псевдонимы DATABASES, отдельные файлы SQLite; пустой
+список (по умолчанию) выключает шардирование. Пост лежит в шарде
+автора: shard_of_author(id автора). Комментарии лежат в шарде своего
+поста, поэтому комментарии поста и их число читаются из одного файла.
+
+Id поста дает остаток от деления на число шардов, равный остатку id
+автора: посты нумерует post_id_sequence в шарде, номер n превращается
+в n * N + номер шарда (next_post_id(), его вызывает сигнал pre_save).
+По id из адреса /posts/<id>/ шард находится без обращения к базе,
+и страница поста читает один файл. Комментариям достаточно id,
+уникальных внутри шарда.
+
+ShardRouter направляет запросы к Post и Comment по подсказке instance:
+сохранение поста или комментария (в том числе objects.create(), см.
+ShardedQuerySet), author.posts, post.comments и comment.post. Без
+подсказки запрос уходит дальше по цепочке роутеров. Представления
+с шардами:
+
+* профиль - author.posts, один шард автора;
+* страница поста - get_post(), один шард по id;
+* главная и группа - scatter() и paginate(): каждый шард отдает не
+  больше страницы постов по индексу (pub_date, id), а потоки
+  сливаются слиянием k отсортированных списков (merge_latest());
+* лента подписок - followed(): опрашиваются только шарды, где есть
+  авторы из подписок, материализованная лента TimelineEntry
+  не ведется.
+
+Внешние ключи между файлами SQLite не проверяет, поэтому в шардах
+PRAGMA foreign_keys выключается (OPTIONS['pragmas'] бэкенда
+core.backends.sqlite3), а автор и группа постов шарда подгружаются
+из основной базы attach_related(), а не select_related(). В шарды
+мигрирует и пустая таблица TimelineEntry: удаление поста каскадно
+удаляет его строки ленты в той же базе.
+
+Поиск FTS5, ленты RSS и Atom, API и подписи трендов пока читают
+посты основной базы и шардов не видят; удаление пользователя
+не удаляет его посты в шарде.
+"""
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+
+from .models import Comment, Group, Post
+from .pagination import ORDERING, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+SEQUENCE = 'post_id_sequence'
+SHARDED_MODELS = (Post, Comment)
+# таблицы шарда: пустая лента нужна каскадному удалению постов
+SHARD_TABLES = ('post', 'comment', 'timelineentry')
+
+
+def get_shards():
+    return getattr(settings, 'POST_SHARDS', [])
+
+
+def shard_of_author(author_id):
+    shards = get_shards()
+    return shards[author_id % len(shards)]
+
+
+def shard_of_post(post_id):
+    # id поста и id автора дают один остаток, см. next_post_id()
+    shards = get_shards()
+    return shards[post_id % len(shards)]
+
+
+def install(using):
+    """Создает счетчик id постов в шарде, если его нет."""
+    with using.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEQUENCE} '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT)'
+        )
+
+
+def next_post_id(author_id):
+    """
+    Id нового поста автора. Номер выдает вставка в AUTOINCREMENT-
+    таблицу шарда - одна атомарная операция без гонок между
+    процессами; старые строки счетчика удаляются, номера не
+    повторяются и после этого.
+    """
+    shards = get_shards()
+    alias = shard_of_author(author_id)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'INSERT INTO {SEQUENCE} DEFAULT VALUES')
+        number = cursor.lastrowid
+        cursor.execute(f'DELETE FROM {SEQUENCE} WHERE id < %s', [number])
+    return number * len(shards) + shards.index(alias)
+
+
+class ShardRouter:
+    def shard(self, model, hints):
+        """Шард запроса по подсказке instance или None."""
+        instance = hints.get('instance')
+        if model is Post:
+            if isinstance(instance, Post):
+                if instance.pk is not None:
+                    return shard_of_post(instance.pk)
+                return shard_of_author(instance.author_id)
+            # author.posts
+            if isinstance(instance, User):
+                return shard_of_author(instance.pk)
+            # comment.post
+            if isinstance(instance, Comment):
+                return shard_of_post(instance.post_id)
+        if model is Comment:
+            if isinstance(instance, Comment):
+                return shard_of_post(instance.post_id)
+            # post.comments
+            if isinstance(instance, Post):
+                return shard_of_post(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if get_shards() and model in SHARDED_MODELS:
+            return self.shard(model, hints)
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # посты шарда ссылаются на пользователей и группы основной
+        # базы по id, без внешних ключей
+        shards = get_shards()
+        if obj1._state.db in shards or obj2._state.db in shards:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in get_shards():
+            return None
+        return app_label == 'posts' and model_name in SHARD_TABLES
+
+
+def scatter(queryset):
+    """
+    Копии запроса для каждого шарда; без шардов и для моделей основной
+    базы - сам запрос.
+    """
+    shards = get_shards()
+    if not shards or queryset.model not in SHARDED_MODELS:
+        return [queryset]
+    return [queryset.using(alias) for alias in shards]
+
+
+def merge_latest(querysets, limit, after=None):
+    """
+    limit самых новых постов из нескольких запросов в порядке
+    (-pub_date, -id). after - условие курсора, как в
+    CursorPaginator.filter_after().
+    """
+    streams = []
+    for queryset in querysets:
+        queryset = queryset.order_by(*ORDERING)
+        if after is not None:
+            queryset = queryset.filter(after)
+        streams.append(queryset[:limit])
+    merged = heapq.merge(
+        *streams, key=lambda post: (post.pub_date, post.pk), reverse=True,
+    )
+    return list(islice(merged, limit))
+
+
+def followed(queryset, author_ids):
+    """
+    Запросы постов авторов author_ids для ленты подписок: каждый шард
+    спрашивается только о своих авторах.
+    """
+    if not get_shards():
+        return [queryset.filter(author_id__in=author_ids)]
+    by_shard = defaultdict(list)
+    for author_id in author_ids:
+        by_shard[shard_of_author(author_id)].append(author_id)
+    return [
+        queryset.using(alias).filter(author_id__in=ids)
+        for alias, ids in by_shard.items()
+    ]
+
+
+def paginate(querysets, per_page, token=None):
+    """
+    Страница слияния запросов от новых постов к старым: первая или,
+    с токеном курсора ?after=, следующая за ним. Листается только
+    курсором - число постов по всем шардам не считается.
+    """
+    cursor = decode_cursor(token) if token else None
+    after = None
+    if cursor is not None:
+        pub_date, pk = cursor
+        after = Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+    # лишний пост показывает, есть ли следующая страница
+    posts = merge_latest(querysets, per_page + 1, after)
+    page_posts = attach_related(posts[:per_page])
+    number = 1 if after is None else None
+    page = Page(page_posts, number, Paginator(page_posts, per_page))
+    page.next_cursor = None
+    if len(posts) > per_page:
+        page.next_cursor = encode_cursor(page_posts[-1])
+    return page
+
+
+def get_post(queryset, post_id):
+    """Пост по id из его шарда; Post.DoesNotExist, если его нет."""
+    if get_shards():
+        queryset = queryset.using(shard_of_post(post_id))
+    return queryset.get(pk=post_id)
+
+
+def attach_related(objects):
+    """
+    Подставляет постам и комментариям авторов, а постам и группы
+    из основной базы: по запросу на модель вместо JOIN, который между
+    файлами невозможен.
+    """
+    authors = User.objects.in_bulk({obj.author_id for obj in objects})
+    group_ids = {
+        obj.group_id for obj in objects
+        if getattr(obj, 'group_id', None) is not None
+    }
+    groups = Group.objects.in_bulk(group_ids) if group_ids else {}
+    for obj in objects:
+        obj.author = authors[obj.author_id]
+        if isinstance(obj, Post):
+            obj.group = groups.get(obj.group_id)
+    return objects
@@ -0,0 +1,131 @@
+from django.db import connections, transaction
+from django.db.models.signals import (
+    post_delete, post_init, post_migrate, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import (
+    caching, search, sharding, stats, thumbnails, timeline, trending,
+)
+from .models import (
+    Comment, Follow, Post, Recommendation, User, UserStats,
+)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # запоминаем группу, чтобы при переносе поста сбросить кэш старой;
+    # через __dict__, чтобы не загружать отложенное поле
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(pre_save, sender=Post)
+def post_id_assigned(sender, instance, **kwargs):
+    # id поста указывает на шард автора, см. posts/sharding.py
+    if instance.pk is None and sharding.get_shards():
+        instance.pk = sharding.next_post_id(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    # новый пост попадает в ленты подписчиков автора; с шардами лента
+    # подписок собирается из шардов при чтении
+    if created:
+        if not sharding.get_shards():
+            timeline.fan_out(instance)
+        stats.bump(instance.author_id, posts=1)
+        trending.record_post(instance)
+    caching.bump(*caching.post_scopes(
+        instance, group_ids=[instance._loaded_group_id],
+    ))
+    instance._loaded_group_id = instance.group_id
+    # миниатюры готовятся в фоне после коммита, чтобы воркер увидел пост
+    if instance.image:
+        transaction.on_commit(lambda: thumbnails.schedule_post(instance))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # комментарии удаляются каскадом раньше поста, см. comment_deleted
+    stats.cascade_started(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, posts=-1)
+    stats.cascade_finished(instance)
+    caching.bump(*caching.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, comments=1)
+        trending.record_comment(instance)
+        # на карточках постов выводится число комментариев
+        caching.bump(*caching.comment_scopes(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # счетчики и кэш списков обновит удаление самого поста
+    if stats.in_cascade(instance):
+        return
+    stats.bump(instance.author_id, comments=-1)
+    caching.bump(*caching.comment_scopes(instance.post))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    # после подписки в ленте сразу видны последние посты автора
+    if created:
+        if not sharding.get_shards():
+            timeline.backfill(instance.user_id, instance.author_id)
+        stats.bump(instance.user_id, following=1)
+        stats.bump(instance.author_id, followers=1)
+        # рекомендации пересчитываются пакетно, а уже выбранного
+        # автора убираем из них сразу
+        Recommendation.objects.filter(
+            user_id=instance.user_id, candidate_id=instance.author_id,
+        ).delete()
+        caching.bump(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if not sharding.get_shards():
+        timeline.prune(instance.user_id, instance.author_id)
+    stats.bump(instance.user_id, following=-1)
+    stats.bump(instance.author_id, followers=-1)
+    caching.bump(*follow_scopes(instance))
+
+
+def follow_scopes(follow):
+    # счетчики подписок выводятся в карточках обоих профилей
+    usernames = User.objects.filter(
+        pk__in=[follow.user_id, follow.author_id],
+    ).values_list('username', flat=True)
+    return [caching.listing_scope('profile', name) for name in usernames]
+
+
+@receiver(post_migrate)
+def search_index_restored(sender, using, **kwargs):
+    # SQLite пересоздает posts_post при изменении схемы, и триггеры
+    # поискового индекса удаляются вместе со старой таблицей
+    if sender.name != 'posts':
+        return
+    connection = connections[using]
+    if search.TABLE in connection.introspection.table_names():
+        search.install(connection)
+
+
+@receiver(post_migrate)
+def post_id_sequence_installed(sender, using, **kwargs):
+    if sender.name == 'posts' and using in sharding.get_shards():
+        sharding.install(connections[using])
@@ -0,0 +1,138 @@
+"""
+Денормализованные счетчики пользователей (UserStats).
+
+Пост удаляется вместе с комментариями, и сигнал post_delete приходит
+по каждому из них. Вместо запроса на комментарий удаление поста
+запоминает авторов его комментариев (cascade_started) и пересчитывает
+их счетчики одним UPDATE в конце (cascade_finished).
+
+С шардами (posts/sharding.py) посты и комментарии считаются в каждом
+шарде отдельно и суммируются: подзапрос к другому файлу невозможен.
+"""
+import threading
+from collections import Counter
+
+from django.db.models import (
+    Case, Count, F, IntegerField, OuterRef, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from . import sharding
+from .models import Comment, Follow, Post, User, UserStats
+
+# SQLite вставляет не больше 500 строк одним INSERT
+BATCH_SIZE = 500
+
+_local = threading.local()
+
+
+def bump(user_id, **deltas):
+    """Атомарно меняет счетчики пользователя: bump(id, posts=1)."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    for field, delta in deltas.items():
+        if delta < 0:
+            # счетчик не уходит в минус, расхождение исправит reconcile
+            stats = stats.filter(**{f'{field}__gte': -delta})
+    updated = stats.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        # строки еще нет - заводим ее по реальным данным
+        reconcile([user_id])
+
+
+def _cascades():
+    if not hasattr(_local, 'cascades'):
+        _local.cascades = {}
+    return _local.cascades
+
+
+def cascade_started(post):
+    """Пост удаляется: запоминает авторов его комментариев."""
+    # post.comments читает шард поста
+    _cascades()[post.pk] = list(
+        post.comments.order_by().values_list(
+            'author_id', flat=True,
+        ).distinct()
+    )
+
+
+def in_cascade(comment):
+    """Комментарий удаляется вместе со своим постом."""
+    return comment.post_id in _cascades()
+
+
+def cascade_finished(post):
+    """Пересчитывает счетчики комментариев после удаления поста."""
+    recount_comments(_cascades().pop(post.pk, []))
+
+
+def recount_comments(user_ids):
+    """Пересчитывает число комментариев пользователей одним UPDATE."""
+    if not user_ids:
+        return
+    if sharding.get_shards():
+        counts = _count_by(Comment.objects.all(), 'author_id', user_ids)
+        UserStats.objects.filter(user_id__in=user_ids).update(
+            comments=Case(
+                *(
+                    When(user_id=user_id, then=Value(count))
+                    for user_id, count in counts.items()
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        return
+    comments = Comment.objects.filter(
+        author_id=OuterRef('user_id'),
+    ).order_by().values('author_id').annotate(
+        count=Count('pk'),
+    ).values('count')
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        comments=Coalesce(
+            Subquery(comments, output_field=IntegerField()), 0
+        ),
+    )
+
+
+def _count_by(queryset, field, user_ids):
+    if user_ids is not None:
+        queryset = queryset.filter(**{f'{field}__in': user_ids})
+    counts = Counter()
+    for shard in sharding.scatter(queryset):
+        counts.update(dict(
+            shard.values_list(field).annotate(count=Count('pk')).order_by()
+        ))
+    return counts
+
+
+def reconcile(user_ids=None):
+    """
+    Пересчитывает счетчики пачкой агрегирующих запросов
+    и возвращает число обновленных пользователей.
+    """
+    followers = _count_by(Follow.objects.all(), 'author_id', user_ids)
+    following = _count_by(Follow.objects.all(), 'user_id', user_ids)
+    posts = _count_by(Post.objects.all(), 'author_id', user_ids)
+    comments = _count_by(Comment.objects.all(), 'author_id', user_ids)
+
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    stats = [
+        UserStats(
+            user_id=user_id,
+            followers=followers.get(user_id, 0),
+            following=following.get(user_id, 0),
+            posts=posts.get(user_id, 0),
+            comments=comments.get(user_id, 0),
+        )
+        for user_id in users.values_list('pk', flat=True).iterator()
+    ]
+    if user_ids is None:
+        UserStats.objects.all().delete()
+    else:
+        UserStats.objects.filter(user_id__in=user_ids).delete()
+    UserStats.objects.bulk_create(stats, batch_size=BATCH_SIZE)
+    return len(stats)
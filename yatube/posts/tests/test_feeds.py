@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class FeedsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.post = Post.objects.create(
+            text='Текст поста', author=cls.author, group=cls.group,
+        )
+        cls.feeds = {
+            reverse('posts:group_rss', kwargs={'slug': 'test-slug'}): (
+                'application/rss+xml'
+            ),
+            reverse('posts:group_atom', kwargs={'slug': 'test-slug'}): (
+                'application/atom+xml'
+            ),
+            reverse('posts:profile_rss', kwargs={'username': 'author'}): (
+                'application/rss+xml'
+            ),
+            reverse('posts:profile_atom', kwargs={'username': 'author'}): (
+                'application/atom+xml'
+            ),
+        }
+
+    def test_feeds_show_posts(self):
+        """Ленты группы и автора содержат их посты."""
+        post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk},
+        )
+        for url, content_type in self.feeds.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type
+                ))
+                self.assertContains(response, 'Текст поста')
+                self.assertContains(response, post_url)
+
+    def test_pages_link_feeds(self):
+        """Страницы группы и автора ссылаются на свои ленты."""
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        )
+        self.assertContains(
+            response,
+            reverse('posts:group_atom', kwargs={'slug': 'test-slug'}),
+        )
+
+    def test_polling_gets_not_modified(self):
+        """Повторный опрос без изменений получает 304 без запросов."""
+        for url in self.feeds:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    not_modified = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'],
+                    )
+                self.assertEqual(not_modified.status_code, 304)
+                not_modified = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                )
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_feeds_are_cached_until_edit(self):
+        """Ленты берутся из кэша, пока пост не создадут или не изменят."""
+        url = reverse('posts:group_rss', kwargs={'slug': 'test-slug'})
+        self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.assertContains(self.guest_client.get(url), 'Исправленный текст')
+        Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group,
+        )
+        self.assertContains(self.guest_client.get(url), 'Новый пост')
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Comment, Group, Post
@@ -16,7 +18,7 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -109,7 +111,7 @@ class PostCreateFormTests(TestCase):
                 text='Тестовый текст добавленного поста',
                 group=self.group,
                 author=self.user,
-                image='posts/small.gif'
+                image='posts/small.jpg'
             ).exists()
         )
 
@@ -179,3 +181,86 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(text='Измененный текст')[0],
             Post.objects.all()
         )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, IMAGE_MAX_SIZE=100,
+    RATELIMIT_ENABLED=False,
+)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post_image(self, name, content):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(name, content),
+            },
+        )
+
+    def encode(self, mode, size, image_format, **options):
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, image_format, **options)
+        return buffer.getvalue()
+
+    def upload(self, name, mode, size, image_format, **options):
+        self.post_image(name, self.encode(mode, size, image_format, **options))
+        return Post.objects.latest('pk')
+
+    def test_photo_is_downscaled_and_stripped(self):
+        """Фото уменьшается, теряет EXIF и сохраняется в progressive JPEG."""
+        exif = Image.Exif()
+        # модель камеры и поворот на 90 градусов
+        exif[0x0110] = 'Camera'
+        exif[0x0112] = 6
+        post = self.upload('photo.jpeg', 'RGB', (400, 200), 'JPEG', exif=exif)
+
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        # поворот из EXIF применен до уменьшения
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertEqual(post.image_size, post.image.size)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(len(image.getexif()), 0)
+            self.assertTrue(image.info.get('progressive'))
+
+    def test_transparent_image_becomes_webp(self):
+        """Картинка с прозрачностью сохраняется в WebP."""
+        post = self.upload('logo.png', 'RGBA', (50, 50), 'PNG')
+
+        self.assertEqual(post.image.name, 'posts/logo.webp')
+        self.assertEqual((post.image_width, post.image_height), (50, 50))
+
+    def test_truncated_image_is_rejected(self):
+        """Обрезанный файл - ошибка формы, а не 500."""
+        content = self.encode('RGB', (400, 200), 'JPEG')
+        response = self.post_image('photo.jpeg', content[:len(content) // 2])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=100 * 100)
+    def test_oversized_image_is_rejected(self):
+        """Не-JPEG больше IMAGE_MAX_PIXELS не декодируется."""
+        response = self.post_image(
+            'big.png', self.encode('RGB', (200, 200), 'PNG'),
+        )
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+        # JPEG той же площади декодируется уменьшенным
+        post = self.upload('big.jpeg', 'RGB', (200, 200), 'JPEG')
+        self.assertEqual((post.image_width, post.image_height), (100, 100))
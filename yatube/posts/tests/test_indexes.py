@@ -0,0 +1,80 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# полный проход по таблице без индекса: "SCAN posts_post"
+TABLE_SCAN = re.compile(r'^SCAN (TABLE )?"?(posts_\w+|auth_user)"?$')
+
+
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group,
+            )
+            Comment.objects.create(text='-', post=post, author=cls.user)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def query_plans(self, url):
+        """Планы всех запросов к постам, выполненных при открытии url."""
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if 'posts_post' not in query['sql']:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append([row[-1] for row in cursor.fetchall()])
+        return plans
+
+    def test_list_views_use_indexes(self):
+        """Списки постов читаются по индексам, а не полным проходом."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                plans = self.query_plans(url)
+                self.assertTrue(plans)
+                for plan in plans:
+                    for detail in plan:
+                        self.assertNotRegex(detail, TABLE_SCAN)
+                        self.assertNotIn('TEMP B-TREE FOR ORDER BY', detail)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка запрещена на уровне базы."""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.user, author=self.author)
+
+    def test_follow_needs_author(self):
+        """Подписка без автора запрещена: NULL обошел бы уникальность."""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.user, author=None)
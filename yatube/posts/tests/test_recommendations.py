@@ -0,0 +1,158 @@
+import math
+import random
+from collections import Counter
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Recommendation
+from posts.views import who_to_follow
+
+User = get_user_model()
+
+
+class RecommendationsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'b', 'c', 'd', 'e', 'f', 'g')
+        }
+        # reader читает b и c, они читают d и e;
+        # f, как и reader, читает b, а еще g
+        for user, author in (
+            ('reader', 'b'), ('reader', 'c'),
+            ('b', 'd'), ('c', 'd'), ('c', 'e'),
+            ('f', 'b'), ('f', 'g'),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author],
+            )
+
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.users['reader'])
+
+    def build(self, **options):
+        call_command('build_recommendations', stdout=StringIO(), **options)
+
+    def recommended(self, name):
+        return list(Recommendation.objects.filter(
+            user=self.users[name],
+        ).values_list('candidate__username', 'mutual'))
+
+    def test_friends_of_friends_and_co_follow(self):
+        """Кандидаты - друзья друзей и подписки похожих читателей."""
+        self.build()
+        recommended = self.recommended('reader')
+        # d читают обе подписки и он первый
+        self.assertEqual(recommended[0], ('d', 2))
+        self.assertCountEqual(recommended[1:], [('e', 1), ('g', 0)])
+
+    def test_count_limit(self):
+        """Хранится не больше --count рекомендаций."""
+        self.build(count=1)
+        self.assertEqual(self.recommended('reader'), [('d', 2)])
+
+    def test_batches_match_brute_force(self):
+        """Расчет пачками совпадает с подсчетом по определению."""
+        rng = random.Random(1)
+        users = [
+            User.objects.create_user(username=f'user{i}') for i in range(30)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in users
+            for author in rng.sample(users, 4)
+            if author != user
+        )
+        self.build(count=1000, batch_size=7)
+
+        following = {}
+        for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id',
+        ):
+            following.setdefault(user_id, set()).add(author_id)
+        followers = Counter(
+            Follow.objects.values_list('author_id', flat=True)
+        )
+        for user in users:
+            with self.subTest(user=user.username):
+                mine = following.get(user.pk, set())
+                mutual = Counter(
+                    candidate
+                    for author in mine
+                    for candidate in following.get(author, ())
+                )
+                similar = {
+                    other: sum(
+                        1 / math.log(2 + followers[author])
+                        for author in mine & theirs
+                    ) / math.sqrt(len(theirs))
+                    for other, theirs in following.items()
+                    if other != user.pk and mine & theirs
+                }
+                total = sum(similar.values()) or 1
+                scores = Counter(mutual)
+                for other, weight in similar.items():
+                    for candidate in following[other]:
+                        scores[candidate] += weight / total
+                expected = {
+                    candidate: (score, mutual[candidate])
+                    for candidate, score in scores.items()
+                    if candidate != user.pk and candidate not in mine
+                }
+                stored = {
+                    candidate: (score, common)
+                    for candidate, score, common in
+                    Recommendation.objects.filter(user=user).values_list(
+                        'candidate_id', 'score', 'mutual',
+                    )
+                }
+                self.assertEqual(stored.keys(), expected.keys())
+                for candidate, (score, common) in stored.items():
+                    self.assertAlmostEqual(score, expected[candidate][0])
+                    self.assertEqual(common, expected[candidate][1])
+
+    def test_pages_show_recommendations(self):
+        """Блок выводится в ленте подписок и профиле одним запросом."""
+        self.build()
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:recommendations'),
+        ):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                first = response.context['recommendations'][0]
+                self.assertEqual(first.candidate.username, 'd')
+                self.assertContains(response, 'На кого подписаться')
+
+        with self.assertNumQueries(1):
+            list(who_to_follow(self.users['reader']))
+
+    def test_cached_profile_loads_fresh_recommendations(self):
+        """Рекомендации профиля не кэшируются вместе со страницей."""
+        self.build()
+        profile = reverse('posts:profile', kwargs={'username': 'b'})
+        block = reverse('posts:recommendations')
+        follow = reverse('posts:profile_follow', kwargs={'username': 'd'})
+        self.assertContains(self.reader_client.get(profile), block)
+        self.assertContains(self.reader_client.get(block), follow)
+
+        self.reader_client.get(follow)
+        # профиль b не менялся и отдается из кэша
+        self.assertContains(self.reader_client.get(profile), block)
+        self.assertNotContains(self.reader_client.get(block), follow)
+
+    def test_follow_removes_recommendation(self):
+        """Выбранный автор сразу пропадает из рекомендаций."""
+        self.build()
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'd'})
+        )
+        self.assertNotIn('d', dict(self.recommended('reader')))
+
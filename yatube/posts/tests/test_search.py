@@ -0,0 +1,133 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        cls.author = User.objects.create_user(username='author')
+        cls.another_author = User.objects.create_user(username='another')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.cat_post = Post.objects.create(
+            text='Кот ловит мышей', author=cls.author, group=cls.group,
+        )
+        cls.cats_post = Post.objects.create(
+            text='Кот, кот и еще котенок', author=cls.another_author,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собака лает', author=cls.author,
+        )
+
+    def found(self, **params):
+        response = self.guest_client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_search_ranks_by_relevance(self):
+        """Находятся посты со словом, более релевантные выше."""
+        self.assertEqual(
+            self.found(q='кот'), [self.cats_post, self.cat_post]
+        )
+
+    def test_words_match_by_prefix_and_case(self):
+        """Слово ищется без учета регистра и как начало слова."""
+        self.assertEqual(self.found(q='КОТЕН'), [self.cats_post])
+        self.assertEqual(self.found(q='кот мыш'), [self.cat_post])
+
+    def test_query_syntax_is_ignored(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        self.assertEqual(self.found(q='"собака" OR (NEAR*'), [])
+        self.assertEqual(self.found(q='собака" -'), [self.dog_post])
+        self.assertEqual(self.found(q=''), [])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении постов."""
+        Post.objects.filter(pk=self.dog_post.pk).update(text='Собака и кот')
+        self.assertIn(self.dog_post, self.found(q='кот'))
+        self.assertEqual(self.found(q='лает'), [])
+
+        Post.objects.filter(pk=self.cat_post.pk).delete()
+        self.assertEqual(self.found(q='мышей'), [])
+
+    def test_search_scope(self):
+        """Поиск ограничивается группой и автором."""
+        self.assertEqual(
+            self.found(q='кот', group='test-slug'), [self.cat_post]
+        )
+        self.assertEqual(
+            self.found(q='кот', author='another'), [self.cats_post]
+        )
+
+    @mock.patch('posts.views.OFFSET_PAGES', 1)
+    def test_cursor_pagination(self):
+        """Результаты листаются курсором без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Кот номер {number}', author=self.author)
+            for number in range(20)
+        )
+        expected = list(
+            search.search_posts('кот', Post.objects.all())
+        )
+
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'кот'}
+        )
+        seen = list(response.context['page_obj'])
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;after=')
+        while cursor:
+            page_obj = self.guest_client.get(
+                reverse('posts:search'), {'q': 'кот', 'after': cursor}
+            ).context['page_obj']
+            seen.extend(page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 22)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет по индексу FTS5."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password',
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котенок'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.cats_post]
+        )
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс и триггеры."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.TABLE} ({search.TABLE}) "
+                "VALUES ('delete-all')"
+            )
+            cursor.execute(f'DROP TRIGGER {search.TABLE}_insert')
+        self.assertEqual(self.found(q='кот'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.found(q='кот')), 2)
+        new_post = Post.objects.create(text='Новый кот', author=self.author)
+        self.assertIn(new_post, self.found(q='кот'))
@@ -0,0 +1,298 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import sharding, stats
+from posts.models import Comment, Follow, Group, Post, UserStats
+from posts.pagination import CursorPaginator, encode_cursor
+
+User = get_user_model()
+
+
+@override_settings(POST_SHARDS=['shard_0', 'shard_1'])
+class ShardRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = sharding.ShardRouter()
+
+    def test_posts_follow_author(self):
+        """Новый пост - в шарде автора, сохраненный - по остатку id."""
+        self.assertEqual(
+            self.router.db_for_write(Post, instance=Post(author_id=3)),
+            'shard_1',
+        )
+        self.assertEqual(
+            self.router.db_for_read(Post, instance=Post(pk=4, author_id=6)),
+            'shard_0',
+        )
+        # author.posts
+        self.assertEqual(
+            self.router.db_for_read(Post, instance=User(pk=5)), 'shard_1',
+        )
+
+    def test_comments_follow_post(self):
+        self.assertEqual(
+            self.router.db_for_write(
+                Comment, instance=Comment(post_id=7, author_id=2),
+            ),
+            'shard_1',
+        )
+        # post.comments
+        self.assertEqual(
+            self.router.db_for_read(Comment, instance=Post(pk=6)), 'shard_0',
+        )
+        # comment.post
+        self.assertEqual(
+            self.router.db_for_read(Post, instance=Comment(post_id=9)),
+            'shard_1',
+        )
+
+    def test_other_queries_are_not_routed(self):
+        """Без подсказки и для других моделей решают другие роутеры."""
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertIsNone(self.router.db_for_read(Follow, instance=User(pk=1)))
+
+    def test_only_posts_and_comments_are_migrated_to_shards(self):
+        self.assertTrue(self.router.allow_migrate('shard_0', 'posts', 'post'))
+        # каскадное удаление поста чистит ленту в той же базе
+        self.assertTrue(
+            self.router.allow_migrate('shard_0', 'posts', 'timelineentry'),
+        )
+        self.assertFalse(
+            self.router.allow_migrate('shard_0', 'posts', 'follow'),
+        )
+        self.assertFalse(self.router.allow_migrate('shard_0', 'auth', 'user'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+    @override_settings(POST_SHARDS=[])
+    def test_disabled_without_shards(self):
+        self.assertIsNone(
+            self.router.db_for_write(Post, instance=Post(author_id=3)),
+        )
+
+
+class ShardedPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.other_user = User.objects.create_user(username='other_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=author, group=cls.group,
+            )
+            for i in range(4)
+            for author in (cls.user, cls.other_user)
+        ]
+
+    def expected(self, queryset, limit):
+        return list(queryset.order_by('-pub_date', '-pk')[:limit])
+
+    def test_merge_latest(self):
+        """Слияние потоков совпадает с одним запросом по всем постам."""
+        streams = [
+            Post.objects.filter(author=self.user),
+            Post.objects.filter(author=self.other_user),
+        ]
+        self.assertEqual(
+            sharding.merge_latest(streams, 5),
+            self.expected(Post.objects.all(), 5),
+        )
+        after = CursorPaginator(Post.objects.all(), 5).filter_after(
+            encode_cursor(self.posts[4]),
+        )
+        self.assertEqual(
+            sharding.merge_latest(streams, 5, after),
+            self.expected(Post.objects.filter(after), 5),
+        )
+
+    def test_followed(self):
+        self.assertEqual(
+            sharding.merge_latest(
+                sharding.followed(Post.objects.all(), [self.user.pk]), 3,
+            ),
+            self.expected(Post.objects.filter(author=self.user), 3),
+        )
+
+    def test_attach_related(self):
+        """Авторы и группы подгружаются запросом на модель."""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(2):
+            sharding.attach_related(posts)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                {(post.author.username, post.group.slug) for post in posts},
+                {('auth_user', 'test-slug'), ('other_user', 'test-slug')},
+            )
+
+    # основная база - второй шард: в первый ничего не попадает
+    @override_settings(POST_SHARDS=['shard_0', 'default'])
+    def test_post_id_points_to_author_shard(self):
+        """Id нового поста дает шард автора, страница поста - один шард."""
+        sharding.install(connection)
+        # в основной базе уже есть посты класса с обычными id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {sharding.SEQUENCE} (id) VALUES (%s)',
+                [Post.objects.latest('pk').pk],
+            )
+        author = User.objects.create_user(pk=101, username='sharded')
+        first, second = (
+            Post.objects.create(text=text, author=author)
+            for text in ('Первый', 'Второй')
+        )
+        self.assertEqual(first.pk % 2, 1)
+        self.assertEqual(second.pk % 2, 1)
+        self.assertGreater(second.pk, first.pk)
+
+        Comment.objects.create(post=first, author=author, text='Коммент')
+        with self.assertNumQueries(1):
+            post = sharding.get_post(Post.objects.all(), first.pk)
+        self.assertEqual(post.comments.get().text, 'Коммент')
+
+
+SHARDS = ['shard_0', 'shard_1']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardedViewsTests(TransactionTestCase):
+    """Страницы читают посты из шардов в отдельных файлах SQLite."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # схема шарда мигрируется один раз, тесты получают копии файла
+        cls.directory = tempfile.mkdtemp()
+        cls.template = cls.add_shard(SHARDS[0], 'template.sqlite3')
+        call_command('migrate', database=SHARDS[0], verbosity=0)
+        cls.remove_shard(SHARDS[0])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def add_shard(cls, alias, name):
+        path = os.path.join(cls.directory, name)
+        connections.databases[alias] = {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': {'pragmas': {'foreign_keys': 0}},
+        }
+        return path
+
+    @classmethod
+    def remove_shard(cls, alias):
+        connections[alias].close()
+        # соединение следующего теста откроет уже новый файл
+        del connections[alias]
+        del connections.databases[alias]
+
+    def setUp(self):
+        for alias in SHARDS:
+            shutil.copy(
+                self.template, self.add_shard(alias, f'{alias}.sqlite3'),
+            )
+            self.addCleanup(self.remove_shard, alias)
+
+        self.group = Group.objects.create(title='Группа', slug='group')
+        # соседние id - авторы в разных шардах
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.shard = sharding.shard_of_author(self.author.pk)
+        self.other_shard = sharding.shard_of_author(self.other.pk)
+        self.post = Post.objects.create(
+            text='Пост автора', author=self.author, group=self.group,
+        )
+        self.other_post = Post.objects.create(
+            text='Пост другого', author=self.other, group=self.group,
+        )
+        self.post.comments.create(author=self.other, text='Комментарий')
+        self.client = Client()
+        self.client.force_login(self.other)
+
+    def test_posts_are_stored_in_author_shard(self):
+        self.assertNotEqual(self.shard, self.other_shard)
+        self.assertEqual(sharding.shard_of_post(self.post.pk), self.shard)
+        self.assertEqual(Post.objects.using('default').count(), 0)
+        self.assertEqual(
+            list(Post.objects.using(self.shard).values_list('pk', flat=True)),
+            [self.post.pk],
+        )
+        self.assertEqual(Comment.objects.using(self.shard).count(), 1)
+
+    def get_from_one_shard(self, url):
+        """Ответ на запрос, который читает только шард автора."""
+        with CaptureQueriesContext(connections[self.shard]) as own, \
+                self.assertNumQueries(0, using=self.other_shard):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(own.captured_queries)
+        return response
+
+    def test_profile_reads_one_shard(self):
+        response = self.get_from_one_shard(
+            reverse('posts:profile', args=[self.author.username]),
+        )
+        self.assertContains(response, 'Пост автора')
+        self.assertNotContains(response, 'Пост другого')
+        self.assertEqual(
+            response.context['page_obj'][0].group.slug, 'group',
+        )
+
+    def test_post_detail_reads_one_shard(self):
+        response = self.get_from_one_shard(
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        self.assertContains(response, 'Пост автора')
+        self.assertContains(response, 'Комментарий')
+        self.assertEqual(response.context['post'].author, self.author)
+
+    def test_add_comment_goes_to_post_shard(self):
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Новый комментарий'},
+        )
+        self.assertEqual(
+            Comment.objects.using(self.shard).filter(
+                text='Новый комментарий',
+            ).count(),
+            1,
+        )
+        # счетчик комментариев собирается по шардам
+        stats.reconcile([self.other.pk])
+        self.assertEqual(UserStats.objects.get(user=self.other).comments, 2)
+
+    def test_lists_merge_shards(self):
+        """Главная и группа сливают шарды от новых постов к старым."""
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=['group']),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    [self.other_post, self.post],
+                )
+
+    def test_follow_index_reads_followed_shards(self):
+        Follow.objects.create(user=self.other, author=self.author)
+        with self.assertNumQueries(0, using=self.other_shard):
+            response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
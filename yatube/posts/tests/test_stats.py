@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import stats
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+        # Создаем автора
+        cls.author = User.objects.create_user(username='author')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_and_unfollow_update_counters(self):
+        """Подписка и отписка меняют счетчики обоих пользователей."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.stats(self.user).following, 1)
+        self.assertEqual(self.stats(self.author).followers, 1)
+
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(self.stats(self.user).following, 0)
+        self.assertEqual(self.stats(self.author).followers, 0)
+
+    def test_posts_and_comments_update_counters(self):
+        """Создание и удаление постов и комментариев меняют счетчики."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(text='Комментарий', post=post, author=self.user)
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.assertEqual(self.stats(self.user).comments, 1)
+
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts, 0)
+        self.assertEqual(self.stats(self.user).comments, 0)
+
+    def test_post_delete_recounts_comments_once(self):
+        """Удаление поста не тратит запросы на каждый комментарий."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        other = Post.objects.create(text='Другой пост', author=self.author)
+        Comment.objects.bulk_create(
+            Comment(text='Комментарий', post=post, author=author)
+            for _ in range(25)
+            for author in (self.user, self.author)
+        )
+        Comment.objects.create(text='Останется', post=other, author=self.user)
+        stats.reconcile()
+
+        # выборка комментариев и их авторов, три DELETE,
+        # счетчик постов и пересчет комментариев
+        with self.assertNumQueries(7):
+            post.delete()
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.assertEqual(self.stats(self.author).comments, 0)
+        self.assertEqual(self.stats(self.user).comments, 1)
+
+    def test_reconcile_command(self):
+        """Команда исправляет разошедшиеся счетчики."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.update(followers=100, following=100, posts=100)
+
+        call_command('reconcile_user_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).followers, 1)
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.assertEqual(self.stats(self.user).following, 1)
+        self.assertEqual(self.stats(self.user).posts, 0)
+
+    def test_profile_shows_counters(self):
+        """Карточка профиля берет счетчики из UserStats."""
+        UserStats.objects.filter(user=self.author).update(
+            followers=50000, posts=7,
+        )
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertContains(response, 'Подписчиков: 50000')
+        self.assertContains(response, 'Записей: 7')
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+# Создаем временную папку для медиа-файлов
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+PLACEHOLDER = 'thumbnail-placeholder'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class DeferredThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        cls.user = User.objects.create_user(username='auth_user')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            text='Текст поста',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='small.gif', content=small_gif, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_missing_thumbnail_is_queued_once(self):
+        """Без готовой миниатюры выводится заглушка, задача ставится раз."""
+        with mock.patch('posts.thumbnails.get_executor') as get_executor:
+            response = self.guest_client.get(reverse('posts:index'))
+            self.assertContains(response, PLACEHOLDER)
+            thumbnails.schedule_post(self.post)
+
+        submit = get_executor.return_value.submit
+        geometry, options = thumbnails.GEOMETRIES[0]
+        submit.assert_called_once_with(
+            thumbnails.generate, self.post.image.name, geometry, options,
+        )
+
+    def test_generated_thumbnail_is_shown(self):
+        """После создания миниатюры карточка и список обновляются."""
+        self.guest_client.get(reverse('posts:index'))
+        geometry, options = thumbnails.GEOMETRIES[0]
+        with mock.patch('posts.thumbnails.get_executor'):
+            thumbnails.generate(self.post.image.name, geometry, options)
+
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, PLACEHOLDER)
+        self.assertContains(response, '<img class="card-img my-2"')
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.updated, self.post.pub_date)
+
+    def test_post_without_image_has_no_placeholder(self):
+        """У поста без картинки нет заглушки."""
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_page_thumbnails_are_looked_up_at_once(self):
+        """Миниатюры всей страницы ищутся одним запросом к хранилищу."""
+        geometry, options = thumbnails.GEOMETRIES[0]
+        with mock.patch('posts.thumbnails.get_executor'):
+            thumbnails.generate(self.post.image.name, geometry, options)
+        for number in range(4):
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user, image=self.post.image,
+            )
+        # холодный кэш: записи хранилища sorl читаются из базы
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        posts = response.context['page_obj']
+        self.assertEqual(len(posts), 5)
+        for post in posts:
+            self.assertIsNotNone(post.thumbnail)
+        # у всех постов одна картинка
+        self.assertContains(response, posts[0].thumbnail.url, count=5)
@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+        # Создаем автора, клиент и логиним его
+        cls.author = User.objects.create_user(username='author')
+        cls.author_client = Client()
+        cls.author_client.force_login(user=cls.author)
+
+        # Создаем посты автора до подписки
+        for i in range(3):
+            Post.objects.create(text=f'Старый пост {i}', author=cls.author)
+
+    def test_follow_backfills_timeline(self):
+        """После подписки в ленте появляются старые посты автора."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3
+        )
+
+    def test_post_create_fans_out(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост'},
+        )
+        post = Post.objects.get(text='Новый пост')
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора уходят из ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timeline_is_trimmed(self):
+        """trim_timelines обрезает ленты до TIMELINE_MAX_LENGTH."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='Самый новый пост', author=self.author)
+        entries = TimelineEntry.objects.filter(user=self.user)
+        # публикация ленты не обрезает
+        self.assertEqual(entries.count(), 3)
+
+        # один DELETE на все ленты
+        with self.assertNumQueries(1):
+            call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(entries[0].post.text, 'Самый новый пост')
+
+    def test_backfill_command(self):
+        """Команда пересобирает ленты по существующим подпискам."""
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3
+        )
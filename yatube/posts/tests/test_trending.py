@@ -0,0 +1,163 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import caching, trending
+from posts.models import Comment, Group, Post, TrendingCounter
+
+User = get_user_model()
+
+HOUR = trending.BUCKET_SECONDS
+NOW = 1000 * trending.BUCKETS * HOUR
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='-',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user, group=cls.group,
+            )
+            for i in range(3)
+        ]
+        cls.other_post = Post.objects.create(
+            text='Пост другой группы', author=cls.user,
+            group=cls.other_group,
+        )
+
+    def setUp(self):
+        # события из setUpClass записаны по текущему времени
+        TrendingCounter.objects.all().delete()
+
+    def comment(self, post, count=1, now=NOW):
+        comment = Comment(post=post, author=self.user, text='-')
+        for _ in range(count):
+            trending.record_comment(comment, now)
+
+    def ranking(self, group_id=None):
+        return [post['id'] for post in trending.trending_posts(group_id)]
+
+    def test_posts_ranked_by_comments(self):
+        """Пост с большим числом комментариев выше в рейтинге."""
+        self.comment(self.posts[0], 1)
+        self.comment(self.posts[1], 3)
+        self.comment(self.other_post, 2)
+        trending.refresh(NOW)
+        self.assertEqual(self.ranking(), [
+            self.posts[1].pk, self.other_post.pk, self.posts[0].pk,
+        ])
+        self.assertEqual(self.ranking(self.group.pk), [
+            self.posts[1].pk, self.posts[0].pk,
+        ])
+        self.assertEqual(trending.trending_posts()[0]['count'], 3)
+
+    def test_old_events_decay(self):
+        """Старые комментарии весят меньше новых и уходят из окна."""
+        self.comment(self.posts[0], 3, now=NOW - 12 * HOUR)
+        self.comment(self.posts[1], 1)
+        trending.refresh(NOW)
+        self.assertEqual(self.ranking()[0], self.posts[1].pk)
+
+        trending.refresh(NOW + 12 * HOUR)
+        self.assertEqual(self.ranking(), [self.posts[1].pk])
+        self.assertFalse(
+            TrendingCounter.objects.filter(object_id=self.posts[0].pk)
+        )
+
+    def test_ring_has_fixed_size(self):
+        """Счетчиков у объекта не больше, чем интервалов в окне."""
+        for hour in range(3 * trending.BUCKETS):
+            self.comment(self.posts[0], now=NOW + hour * HOUR)
+        counters = TrendingCounter.objects.filter(object_id=self.posts[0].pk)
+        self.assertEqual(counters.count(), trending.BUCKETS)
+        trending.refresh(NOW + (3 * trending.BUCKETS - 1) * HOUR)
+        self.assertEqual(
+            trending.trending_posts()[0]['count'], trending.BUCKETS,
+        )
+
+    def test_groups_ranked_by_new_posts(self):
+        """Группы упорядочены по числу новых постов."""
+        for post in self.posts:
+            trending.record_post(post, NOW)
+        trending.record_post(self.other_post, NOW)
+        trending.refresh(NOW)
+        self.assertEqual(
+            [group['slug'] for group in trending.trending_groups()],
+            ['test-slug', 'other-slug'],
+        )
+
+    def test_group_leaves_trending(self):
+        """Группа без событий в окне теряет свой рейтинг."""
+        self.comment(self.other_post)
+        trending.refresh(NOW)
+        self.assertTrue(self.ranking(self.other_group.pk))
+        trending.refresh(NOW + trending.BUCKETS * HOUR)
+        self.assertEqual(self.ranking(self.other_group.pk), [])
+
+    def test_reads_do_not_query_database(self):
+        """Страницы читают тренды только из кэша."""
+        self.comment(self.posts[1], 2)
+        trending.record_post(self.posts[1], NOW)
+        trending.refresh(NOW)
+        with self.assertNumQueries(0):
+            trending.trending_posts()
+            trending.trending_posts(self.group.pk)
+            trending.trending_groups()
+
+        pages = {
+            reverse('posts:index'): 'Тестовая группа +1',
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): (
+                'комментариев за сутки: 2'
+            ),
+        }
+        for url, text in pages.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'В тренде')
+                self.assertContains(response, text)
+
+    def test_refresh_invalidates_cached_listings(self):
+        """Изменившийся рейтинг сбрасывает главную и страницу группы."""
+        versions = {
+            scope: caching.get_version(scope)
+            for scope in ('index', 'group:test-slug', 'group:other-slug')
+        }
+        self.comment(self.posts[0])
+        trending.refresh(NOW)
+        bumped = {
+            scope for scope, version in versions.items()
+            if caching.get_version(scope) != version
+        }
+        self.assertEqual(bumped, {'index', 'group:test-slug'})
+
+        # тот же рейтинг не сбрасывает страницы
+        versions = {scope: caching.get_version(scope) for scope in versions}
+        trending.refresh(NOW)
+        for scope, version in versions.items():
+            with self.subTest(scope=scope):
+                self.assertEqual(caching.get_version(scope), version)
+
+    def test_comment_is_recorded(self):
+        """Новый комментарий учитывается в счетчиках."""
+        client = Client()
+        client.force_login(self.user)
+        client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.posts[2].pk}),
+            data={'text': 'Комментарий'},
+        )
+        trending.refresh()
+        self.assertEqual(self.ranking(), [self.posts[2].pk])
@@ -1,5 +1,4 @@
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.test import Client, TestCase
 
 from posts.models import Group, Post
@@ -118,7 +117,6 @@ class PostsURLTests(TestCase):
 
     def test_urls_html(self):
         """Проверка вызываемых html-шаблонов."""
-        cache.clear()
         templates_url_names = {
             '/': 'index.html',
             '/group/test-slug/': 'posts/group_list.html',
@@ -1,16 +1,18 @@
 import shutil
 import tempfile
 from itertools import islice
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -43,7 +45,6 @@ class ViewsPagesTests(TestCase):
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
-        cache.clear()
         templates_pages_names = {
             reverse('posts:index'): 'base.html',
             reverse('posts:post_create'): 'posts/create_post.html',
@@ -127,8 +128,6 @@ class ContextViewsPagesTests(TestCase):
     def test_home_page_show_correct_context(self):
         """Проверяем, что на главную страницу выводится список всех постов."""
 
-        cache.clear()
-
         posts = Post.objects.all()
         response = self.guest_client.get(reverse('posts:index'))
         # так как всего четыре поста, пагинацию не учитываем и используем
@@ -203,7 +202,6 @@ class ContextViewsPagesTests(TestCase):
     def test_correct_post_display(self):
         """Тестируем корректное отображение поста."""
 
-        cache.clear()
         POST_ID = 3
         posts = Post.objects.all()
         pages = [
@@ -311,8 +309,37 @@ class PaginatorPagesTests(TestCase):
                     len(response.context['page_obj'].object_list), post_count
                 )
 
+    @mock.patch('posts.views.OFFSET_PAGES', 1)
+    def test_cursor_paginator(self):
+        """За номерными страницами лента листается курсором."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        first_page = self.guest_client.get(url).context['page_obj']
+        self.assertIsNotNone(first_page.next_cursor)
+
+        response = self.guest_client.get(
+            url, {'after': first_page.next_cursor}
+        )
+        page_obj = response.context['page_obj']
+        self.assertIsNone(page_obj.number)
+        self.assertIsNone(page_obj.next_cursor)
+        self.assertEqual(
+            list(page_obj.object_list),
+            list(Post.objects.filter(group=self.group)[10:])
+        )
+        self.assertTemplateUsed(
+            response, 'posts/includes/cursor_paginator.html'
+        )
+
+    def test_broken_cursor_opens_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': 'author_wolf'}),
+            {'after': 'not-a-cursor'}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PictureInContextTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -362,8 +389,6 @@ class PictureInContextTests(TestCase):
     def test_post_show_correct_context(self):
         """Пост сформирован с правильным контекстом."""
 
-        cache.clear()
-
         responses = [
             # На главной странице
             self.authorized_client.get(
@@ -422,36 +447,94 @@ class CacheMainPageTests(TestCase):
     def test_cache(self):
         """Тестирование кэширования главной страницы."""
 
-        # чистим кэш, т.е обновляем его и помещаем пост в кэш
-        cache.clear()
-
         # запрашиваем страницу и ищем пост на странице
         response = self.author_client.get(reverse('posts:index'))
         self.assertContains(
             response,
             'Тестовый текст поста'
         )
-        # удаляем пост из базы
-        Post.objects.filter(
-            text='Тестовый текст поста',
-        ).delete()
-
-        # не обновляя кэш, ищем пост на странице, которая использует кэш
+        # меняем пост в обход модели: сигналы не срабатывают,
+        # и страница по-прежнему отдается из кэша
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
         response = self.author_client.get(reverse('posts:index'))
         self.assertContains(
             response,
             'Тестовый текст поста'
         )
-        # обновляем кэш
-        cache.clear()
+        # удаляем пост из базы
+        Post.objects.filter(pk=self.post.pk).delete()
 
-        # пустой кэш подтягивает данные из базы, в которой нет поста
+        # удаление сбрасывает кэш главной страницы без cache.clear()
         response = self.author_client.get(reverse('posts:index'))
         self.assertNotContains(
             response,
             'Тестовый текст поста'
         )
 
+    def test_cache_is_per_viewer(self):
+        """Вошедший не получает страницу, закэшированную для гостя."""
+        Client().get(reverse('posts:index'))
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, reverse('posts:post_create'))
+
+    def test_guests_share_cached_page(self):
+        """Гости с разными cookie получают одну закэшированную страницу."""
+        Client().get(reverse('posts:index'))
+        # добавляем пост в обход модели: версия списка не меняется
+        Post.objects.bulk_create([Post(text='Новый пост', author=self.author)])
+        guest = Client()
+        guest.cookies['csrftoken'] = 'token'
+        response = guest.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Новый пост')
+
+    def test_listing_cache_invalidation(self):
+        """Новый и измененный пост сразу видны в затронутых списках."""
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        # прогреваем кэш
+        for page in pages:
+            self.author_client.get(page)
+
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Свежий пост', 'group': group.id},
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.author_client.get(page)
+                self.assertContains(response, 'Свежий пост')
+
+        # перенос поста в другую группу убирает его из старой
+        post = Post.objects.get(text='Свежий пост')
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Свежий пост'},
+        )
+        response = self.author_client.get(pages[1])
+        self.assertNotContains(response, 'Свежий пост')
+
+    def test_comment_keeps_index_cached(self):
+        """Комментарий сбрасывает профиль автора поста, но не главную."""
+        index = reverse('posts:index')
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        # прогреваем кэш
+        for page in (index, profile):
+            self.author_client.get(page)
+
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий',
+        )
+        self.assertContains(self.author_client.get(profile), 'Комментариев: 1')
+        self.assertNotContains(self.author_client.get(index), 'Комментариев')
+
 
 class CreateDeleteFollowTests(TestCase):
     @classmethod
@@ -590,3 +673,276 @@ class CheckFollowList(TestCase):
         self.assertEqual(
             len(response.context['page_obj'].object_list), 0
         )
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        # Создаем пользователя, клиент и логиним его
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        # Полная страница постов разных авторов и групп с комментариями
+        for i in range(10):
+            author = User.objects.create_user(username=f'author_{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'slug-{i}', description='-'
+            )
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=author,
+                group=cls.group if i % 2 else group,
+            )
+            Comment.objects.create(text='-', post=post, author=cls.user)
+            Follow.objects.create(user=cls.user, author=author)
+
+    def test_list_views_query_count(self):
+        """Число запросов списков не зависит от числа постов на странице."""
+        pages = {
+            # пагинатор (счетчик и страница)
+            reverse('posts:index'): (self.guest_client, 2),
+            # группа, пагинатор
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): (
+                self.guest_client, 3
+            ),
+            # профиль со счетчиками, пагинатор
+            reverse('posts:profile', kwargs={'username': 'author_1'}): (
+                self.guest_client, 3
+            ),
+            # сессия, пользователь, пагинатор, рекомендации
+            reverse('posts:follow_index'): (self.authorized_client, 5),
+        }
+        for url, (client, queries) in pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    client.get(url)
+
+    def test_cards_show_comment_count(self):
+        """Карточка поста показывает число комментариев."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'][0].comment_count, 1)
+        self.assertContains(response, 'Комментариев: 1')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        # Создаем автора, клиент и логиним его
+        cls.author = User.objects.create_user(username='author')
+        cls.author_client = Client()
+        cls.author_client.force_login(user=cls.author)
+
+        cls.post = Post.objects.create(
+            text='Текст поста',
+            author=cls.author,
+        )
+
+    def card_key(self, post):
+        return make_template_fragment_key('post_card', [
+            post.id, post.updated.isoformat(), post.author.username, '', '',
+        ])
+
+    def test_card_is_cached(self):
+        """Карточка поста кэшируется без ссылки на редактирование."""
+        self.author_client.get(reverse('posts:index'))
+        fragment = cache.get(self.card_key(self.post))
+        self.assertIn('Текст поста', fragment)
+        self.assertNotIn('Редактировать', fragment)
+
+        # гость получает карточку из кэша, но без чужой ссылки
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertContains(response, 'Текст поста')
+        self.assertNotContains(response, 'Редактировать')
+
+    def test_edit_invalidates_card(self):
+        """Редактирование поста меняет ключ кэша карточки."""
+        self.author_client.get(reverse('posts:index'))
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Исправленный текст'},
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIsNone(cache.get(self.card_key(post)))
+
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный текст')
+        self.assertContains(response, 'Редактировать')
+
+
+@mock.patch('posts.views.COMMENTS_PER_PAGE', 10)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author)
+        # комментарии разных авторов, часть - с одинаковым временем
+        commenters = [
+            User.objects.create_user(username=f'reader_{i}') for i in range(5)
+        ]
+        Comment.objects.bulk_create(
+            Comment(
+                text=f'Комментарий {i}', post=cls.post,
+                author=commenters[i % 5],
+            )
+            for i in range(25)
+        )
+        cls.newest_first = list(
+            cls.post.comments.order_by('-created', '-pk')
+        )
+
+    def test_newest_comments_are_inline(self):
+        """На странице поста только новые комментарии, авторы - сразу."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        # валидатор для ETag, пост, комментарии с авторами
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(url)
+        self.assertEqual(
+            response.context['comments'], self.newest_first[:10]
+        )
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_comments_fragment_pages(self):
+        """Фрагмент отдает следующие порции без пропусков и повторов."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        seen = list(response.context['comments'])
+        cursor = response.context['comments_cursor']
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        while cursor:
+            with self.assertNumQueries(2):
+                response = self.guest_client.get(url, {'after': cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            self.assertNotContains(response, '<html')
+            seen.extend(response.context['comments'])
+            cursor = response.context['comments_cursor']
+        self.assertEqual(seen, self.newest_first)
+
+    def test_comments_fragment_of_missing_post(self):
+        """Для несуществующего поста фрагмент отвечает 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Создаем неавторизованный клиент
+        cls.guest_client = Client()
+
+        # Создаем автора, клиент и логиним его
+        cls.author = User.objects.create_user(username='author')
+        cls.author_client = Client()
+        cls.author_client.force_login(user=cls.author)
+
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.post = Post.objects.create(
+            text='Текст поста', author=cls.author, group=cls.group,
+        )
+
+    def test_post_detail_not_modified(self):
+        """Актуальная страница поста не строится заново."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        # только валидатор, без поста, комментариев и шаблона
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+
+        Comment.objects.create(
+            text='Новый', post=self.post, author=self.author,
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail_if_modified_since(self):
+        """Гость получает Last-Modified, вошедший - нет."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(url)
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.author_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_etag_depends_on_viewer(self):
+        """У гостя и автора разные версии страницы."""
+        for url in (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ):
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.author_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag,
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_listings_not_modified(self):
+        """Списки отвечают 304 до обращения к базе, пока не изменятся."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url],
+                    )
+                self.assertEqual(response.status_code, 304)
+                # другая страница списка - другой ETag
+                response = self.guest_client.get(
+                    url, {'page': 2}, HTTP_IF_NONE_MATCH=etags[url],
+                )
+                self.assertNotEqual(response.status_code, 304)
+
+        Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url],
+                )
+                self.assertContains(response, 'Новый пост')
@@ -0,0 +1,203 @@
+"""
+Фоновая подготовка миниатюр картинок постов.
+
+Списки постов получают миниатюры через attach_thumbnails(): готовые
+миниатюры всей страницы берутся из key-value хранилища sorl одним
+запросом, недостающие ставятся в очередь пула процессов, и шаблон
+показывает заглушку. Тег {% thumbnail %} тоже работает через
+DeferredThumbnailBackend. Потоки запросов Pillow не вызывают.
+
+Когда миниатюра готова, пост сохраняется заново: меняется ключ кэша
+карточки и сбрасываются закэшированные списки.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+# миниатюры, которые выводятся в шаблонах постов
+GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# пока задача в очереди, повторно ее не ставим
+QUEUED_KEY = 'thumbnail-queued:{}'
+QUEUED_TIMEOUT = 5 * 60
+
+_executor = None
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Отдает только готовые миниатюры, остальные ставит в очередь."""
+
+    def normalize_options(self, source, options):
+        # те же значения по умолчанию, что и в ThumbnailBackend,
+        # иначе имя миниатюры не совпадет с созданной в фоне
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл, под которым миниатюра хранится, - готова она или нет."""
+        source = ImageFile(file_)
+        options = self.normalize_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, без обращения к Pillow."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.lookup(file_, geometry_string, **options)
+        if thumbnail is None:
+            schedule(str(file_), geometry_string, options)
+        return thumbnail
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище sorl, которое умеет читать миниатюры пачкой."""
+
+    def get_many(self, image_files):
+        """
+        Как get() для нескольких файлов: {ключ файла: ImageFile или None}.
+        Один запрос к кэшу и, для промахов, один запрос к базе.
+        """
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        if not keys:
+            return {}
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(
+                    key__in=missing,
+                ).values_list('key', 'value')
+            )
+            # как и _get_raw(), запоминаем в кэше и отсутствие записи
+            loaded = {
+                key: found.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            self.cache.set_many(
+                loaded, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+            )
+            values.update(loaded)
+        result = {}
+        for raw_key, key in keys.items():
+            value = values[raw_key]
+            if not value or value == cached_db_kvstore.EMPTY_VALUE:
+                result[key] = None
+            else:
+                result[key] = deserialize_image_file(value)
+        return result
+
+
+def attach_thumbnails(posts):
+    """
+    Записывает в post.thumbnail готовую миниатюру картинки или None.
+    Миниатюры всей страницы ищутся одним запросом к хранилищу sorl
+    вместо запроса на каждый тег {% thumbnail %}; недостающие ставятся
+    в очередь.
+    """
+    geometry_string, options = GEOMETRIES[0]
+    backend = DeferredThumbnailBackend()
+    files = []
+    for post in posts:
+        post.thumbnail = None
+        if post.image:
+            files.append((post, backend.thumbnail_file(
+                post.image.name, geometry_string, **options,
+            )))
+    found = default.kvstore.get_many(
+        [thumbnail for post, thumbnail in files]
+    )
+    for post, thumbnail in files:
+        post.thumbnail = found[thumbnail.key]
+        if post.thumbnail is None:
+            post.thumbnail = backend.get_thumbnail(
+                post.image.name, geometry_string, **options,
+            )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            initializer=connections.close_all,
+        )
+    return _executor
+
+
+def _queued_key(name, geometry_string, options):
+    return QUEUED_KEY.format(tokey(name, geometry_string, serialize(options)))
+
+
+def schedule(name, geometry_string, options):
+    """Ставит создание миниатюры в очередь пула процессов."""
+    if not cache.add(
+        _queued_key(name, geometry_string, options), True, QUEUED_TIMEOUT,
+    ):
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        # без пула миниатюра создается сразу
+        generate(name, geometry_string, options)
+        return
+    get_executor().submit(generate, name, geometry_string, options)
+
+
+def schedule_post(post):
+    """Ставит в очередь все миниатюры картинки поста."""
+    if not post.image:
+        return
+    backend = DeferredThumbnailBackend()
+    for geometry_string, options in GEOMETRIES:
+        if backend.lookup(post.image.name, geometry_string, **options) is None:
+            schedule(post.image.name, geometry_string, options)
+
+
+def generate(name, geometry_string, options):
+    """Задача пула: создает миниатюру и обновляет посты с картинкой."""
+    from . import sharding
+    from .models import Post
+
+    try:
+        ThumbnailBackend().get_thumbnail(name, geometry_string, **options)
+        posts = chain.from_iterable(
+            sharding.scatter(Post.objects.filter(image=name)),
+        )
+        for post in posts:
+            # новая версия поста: карточка перерисуется уже с картинкой
+            post.save(update_fields=['updated'])
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+    finally:
+        cache.delete(_queued_key(name, geometry_string, options))
@@ -0,0 +1,121 @@
+"""
+Материализованная лента подписок (fan-out on write).
+
+Пост раскладывается по лентам подписчиков в момент создания,
+поэтому чтение ленты - это выборка по индексу (user, -pub_date),
+без соединения таблиц постов и подписок.
+
+Ленты обрезаются до TIMELINE_MAX_LENGTH не при публикации, а командой
+trim_timelines по расписанию: у популярного автора десятки тысяч
+подписчиков, и обрезка их лент в запросе автора держала бы блокировку
+записи. Лишние старые записи до обрезки видны только в глубине ленты.
+"""
+from django.conf import settings
+from django.db import connection
+
+from .models import Follow, Post, TimelineEntry
+
+# сколько записей вставлять в одном INSERT
+BATCH_SIZE = 500
+
+TABLE = TimelineEntry._meta.db_table
+# удаляются записи, после которых в ленте еще не меньше %s более новых.
+# Оба окна идут по возрастанию, как индекс (user, pub_date, post):
+# он покрывает выборку, и SQLite обходится без сортировки
+TRIM = f"""
+DELETE FROM {TABLE} WHERE id IN (
+    SELECT id FROM (
+        SELECT
+            id,
+            row_number() OVER feed AS position,
+            count(*) OVER (
+                feed ROWS BETWEEN UNBOUNDED PRECEDING
+                AND UNBOUNDED FOLLOWING
+            ) AS length
+        FROM {TABLE} {{where}}
+        WINDOW feed AS (PARTITION BY user_id ORDER BY pub_date, post_id)
+    ) WHERE position <= length - %s
+)
+"""
+
+
+def get_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 1000)
+
+
+def _entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    follower_ids = list(
+        Follow.objects.filter(
+            author_id=post.author_id,
+        ).values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for user_id in follower_ids],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя последние посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id,
+    ).only('pk', 'author_id', 'pub_date')[:get_max_length()]
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for post in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id,
+    ).delete()
+
+
+def trim(user_ids=None):
+    """
+    Обрезает ленты до TIMELINE_MAX_LENGTH последних записей одним
+    DELETE: все ленты или только пользователей user_ids. Возвращает
+    число удаленных записей.
+    """
+    where, params = '', []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        where = f'WHERE user_id IN ({", ".join(["%s"] * len(user_ids))})'
+        params = user_ids
+    with connection.cursor() as cursor:
+        cursor.execute(
+            TRIM.format(where=where), [*params, get_max_length()],
+        )
+        return cursor.rowcount
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново из подписок и постов."""
+    author_ids = Follow.objects.filter(
+        user_id=user_id,
+    ).values_list('author_id', flat=True)
+    posts = Post.objects.filter(
+        author_id__in=author_ids,
+    ).only('pk', 'author_id', 'pub_date')[:get_max_length()]
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for post in posts],
+        batch_size=BATCH_SIZE,
+    )
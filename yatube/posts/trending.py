@@ -0,0 +1,194 @@
+"""
+Раздел «В тренде»: посты с самыми частыми комментариями и группы
+с самыми частыми новыми постами за последние сутки.
+
+Создание комментария или поста увеличивает счетчик текущего интервала
+в кольцевом буфере TrendingCounter - одна вставка с ON CONFLICT по
+уникальному индексу; больше пишущий запрос ничего не делает. Раз
+в минуту команда refresh_trending, запускаемая по cron, сводит
+счетчики окна в рейтинг: вклад интервала затухает вдвое каждые
+HALF_LIFE интервалов, лучшие TOP_K постов (всего и по группам) и групп
+вместе с подписями кладутся в кэш. Страницы читают готовый рейтинг
+из кэша и не обращаются ни к постам, ни к комментариям.
+
+Рейтинг выводится на закэшированных страницах списков, поэтому при
+его изменении версии главной и затронутых групп увеличиваются
+(caching.bump): не чаще одного раза за запуск команды.
+"""
+import heapq
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import connection
+from django.template.defaultfilters import truncatechars
+
+from . import caching
+from .models import Group, Post, TrendingCounter
+
+# длина интервала и число интервалов в окне
+BUCKET_SECONDS = 60 * 60
+BUCKETS = 24
+# за сколько интервалов вклад события уменьшается вдвое
+HALF_LIFE = 6
+DECAY = 0.5 ** (1 / HALF_LIFE)
+# сколько постов и групп показывать
+TOP_K = 5
+
+POSTS_KEY = 'trending:posts:{}'
+GROUPS_KEY = 'trending:groups'
+# группы, для которых в кэше лежит рейтинг постов
+GROUP_IDS_KEY = 'trending:group-ids'
+
+UPSERT = f"""
+INSERT INTO {TrendingCounter._meta.db_table}
+    (kind, object_id, group_id, slot, bucket, count)
+VALUES (%s, %s, %s, %s, %s, 1)
+ON CONFLICT (kind, object_id, slot) DO UPDATE SET
+    count = CASE WHEN bucket = excluded.bucket THEN count + 1 ELSE 1 END,
+    bucket = excluded.bucket,
+    group_id = excluded.group_id
+"""
+
+
+def bucket_number(now=None):
+    return int((time.time() if now is None else now) // BUCKET_SECONDS)
+
+
+def record(kind, object_id, group_id, now=None):
+    """Учитывает событие в текущем интервале."""
+    bucket = bucket_number(now)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT, [kind, object_id, group_id, bucket % BUCKETS, bucket],
+        )
+
+
+def record_comment(comment, now=None):
+    record(
+        TrendingCounter.POST, comment.post_id, comment.post.group_id, now,
+    )
+
+
+def record_post(post, now=None):
+    if post.group_id is not None:
+        record(TrendingCounter.GROUP, post.group_id, post.group_id, now)
+
+
+def _scores(counters, current):
+    """
+    Оценки с затуханием, число событий в окне и группы объектов;
+    ключи словарей - пары (вид, ключ объекта).
+    """
+    scores = defaultdict(float)
+    totals = Counter()
+    groups = {}
+    for kind, object_id, group_id, bucket, count in counters:
+        key = (kind, object_id)
+        scores[key] += count * DECAY ** (current - bucket)
+        totals[key] += count
+        groups[key] = group_id
+    return scores, totals, groups
+
+
+def _top(keys, scores):
+    # при равной оценке выше более новый объект
+    return heapq.nlargest(TOP_K, keys, key=lambda key: (scores[key], key))
+
+
+def refresh(now=None):
+    """Сводит счетчики окна в рейтинги и кладет их в кэш."""
+    current = bucket_number(now)
+    oldest = current - BUCKETS + 1
+    # счетчики, вышедшие из окна, больше не понадобятся
+    TrendingCounter.objects.filter(bucket__lt=oldest).delete()
+    counters = TrendingCounter.objects.filter(
+        bucket__gte=oldest,
+    ).values_list('kind', 'object_id', 'group_id', 'bucket', 'count')
+    scores, totals, groups = _scores(counters.iterator(), current)
+
+    post_keys = [key for key in scores if key[0] == TrendingCounter.POST]
+    by_group = defaultdict(list)
+    for key in post_keys:
+        if groups[key] is not None:
+            by_group[groups[key]].append(key)
+    top_posts = {None: _top(post_keys, scores)}
+    for group_id, keys in by_group.items():
+        top_posts[group_id] = _top(keys, scores)
+    top_groups = _top(
+        [key for key in scores if key[0] == TrendingCounter.GROUP], scores,
+    )
+
+    # подписи только для попавших в рейтинг
+    posts = Post.objects.select_related('author').only(
+        'text', 'author__username',
+    ).in_bulk({key[1] for keys in top_posts.values() for key in keys})
+    group_titles = Group.objects.only('title', 'slug').in_bulk(
+        [key[1] for key in top_groups]
+    )
+
+    def post_items(keys):
+        return [
+            {
+                'id': post_id,
+                'text': truncatechars(posts[post_id].text, 80),
+                'author': posts[post_id].author.username,
+                'count': totals[kind, post_id],
+            }
+            for kind, post_id in keys
+            # удаленные посты пропускаем
+            if post_id in posts
+        ]
+
+    values = {
+        POSTS_KEY.format(group_id): post_items(keys)
+        for group_id, keys in top_posts.items()
+    }
+    values[GROUPS_KEY] = [
+        {
+            'slug': group_titles[group_id].slug,
+            'title': group_titles[group_id].title,
+            'count': totals[kind, group_id],
+        }
+        for kind, group_id in top_groups
+        if group_id in group_titles
+    ]
+    values[GROUP_IDS_KEY] = list(by_group)
+    # группы, из которых тренды ушли, не должны показывать старые
+    stale = set(cache.get(GROUP_IDS_KEY, ())) - set(by_group)
+    stale_keys = [POSTS_KEY.format(group_id) for group_id in stale]
+    previous = cache.get_many([*values, *stale_keys])
+    cache.delete_many(stale_keys)
+    # без событий рейтинг устаревает вместе с окном
+    cache.set_many(values, BUCKET_SECONDS * BUCKETS)
+    _bump_listings(values, previous, stale)
+
+
+def _bump_listings(values, previous, stale):
+    """Сбрасывает закэшированные списки, где изменился рейтинг."""
+    changed = {
+        group_id for group_id in values[GROUP_IDS_KEY]
+        if values[POSTS_KEY.format(group_id)]
+        != previous.get(POSTS_KEY.format(group_id))
+    } | stale
+    scopes = []
+    if changed:
+        slugs = Group.objects.filter(pk__in=changed).values_list(
+            'slug', flat=True,
+        )
+        scopes.extend(caching.listing_scope('group', slug) for slug in slugs)
+    if any(
+        values[key] != previous.get(key)
+        for key in (POSTS_KEY.format(None), GROUPS_KEY)
+    ):
+        scopes.append('index')
+    caching.bump(*scopes)
+
+
+def trending_posts(group_id=None):
+    """Посты в тренде, всего или в группе, - только из кэша."""
+    return cache.get(POSTS_KEY.format(group_id), [])
+
+
+def trending_groups():
+    return cache.get(GROUPS_KEY, [])
@@ -1,6 +1,7 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
+from .caching import cache_listing
 
 app_name = 'posts'
 
@@ -9,14 +10,50 @@ urlpatterns = [
     path('', views.index, name='index'),
     # Группа
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    # Ленты RSS и Atom группы
+    path(
+        'group/<slug:slug>/rss/',
+        cache_listing('group', 'slug')(feeds.GroupFeed()),
+        name='group_rss'
+    ),
+    path(
+        'group/<slug:slug>/atom/',
+        cache_listing('group', 'slug')(feeds.GroupAtomFeed()),
+        name='group_atom'
+    ),
     # Профайл пользователя
     path('profile/<str:username>/', views.profile, name='profile'),
+    # Ленты RSS и Atom автора
+    path(
+        'profile/<str:username>/rss/',
+        cache_listing('profile', 'username')(feeds.ProfileFeed()),
+        name='profile_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        cache_listing('profile', 'username')(feeds.ProfileAtomFeed()),
+        name='profile_atom'
+    ),
+    # Рекомендации «на кого подписаться» для страницы профиля
+    path(
+        'recommendations/',
+        views.recommendations,
+        name='recommendations'
+    ),
+    # Поиск
+    path('search/', views.search, name='search'),
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     # Добавление нового поста
     path('create/', views.post_create, name='post_create'),
     # Редактирование поста
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    # Следующие комментарии к записи
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     # Добавление комментария
     path('posts/<int:post_id>/comment', views.add_comment, name='add_comment'),
     # лента подписок
@@ -1,45 +1,130 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from core.ratelimit import ratelimit
+
+from . import sharding
+from .caching import cache_listing
+from .conditional import post_etag, post_last_modified
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Group, Post, Recommendation, User
+from .pagination import CursorPaginator, comment_page
+from .search import SearchPaginator, search_posts
+from .thumbnails import attach_thumbnails
+from .trending import trending_groups, trending_posts
 
 POSTS_PER_PAGE = 10
+# сколько первых страниц доступно по номеру, дальше - по курсору
+OFFSET_PAGES = 5
+# комментариев на странице поста и в каждой следующей порции
+COMMENTS_PER_PAGE = 20
+# сколько рекомендаций «на кого подписаться» показывать
+RECOMMENDATIONS_SHOWN = 5
+
+
+def paginator(posts, request, paginator_class=CursorPaginator):
+    paginator = paginator_class(posts, POSTS_PER_PAGE, OFFSET_PAGES)
+    if 'after' in request.GET:
+        page_obj = paginator.page_after(request.GET['after'])
+    else:
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+    # миниатюры всей страницы - одним запросом
+    attach_thumbnails(page_obj)
+    return page_obj
+
+
+def shard_paginator(querysets, request):
+    """
+    Страница слияния запросов к шардам (posts/sharding.py): первая
+    или следующая за курсором ?after=.
+    """
+    page_obj = sharding.paginate(
+        querysets, POSTS_PER_PAGE, request.GET.get('after'),
+    )
+    attach_thumbnails(page_obj)
+    return page_obj
+
+
+def get_post_or_404(queryset, post_id):
+    """Пост по id из его шарда или 404."""
+    try:
+        return sharding.get_post(queryset, post_id)
+    except Post.DoesNotExist:
+        raise Http404('Пост не найден')
+
 
+def get_comment_page(post, after=None):
+    """Порция комментариев поста с авторами и курсор следующей."""
+    comments = post.comments.all()
+    if not sharding.get_shards():
+        comments = comments.select_related('author')
+    comments, cursor = comment_page(comments, COMMENTS_PER_PAGE, after)
+    if sharding.get_shards():
+        # авторы - в основной базе
+        sharding.attach_related(comments)
+    return comments, cursor
 
-def paginator(posts, request):
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
 
+def who_to_follow(user):
+    """
+    Рекомендации, посчитанные командой build_recommendations:
+    одно чтение по индексу (user, rank).
+    """
+    if not user.is_authenticated:
+        return []
+    return Recommendation.objects.filter(user=user).select_related(
+        'candidate',
+    ).only('mutual', 'candidate__username')[:RECOMMENDATIONS_SHOWN]
 
-@cache_page(20)
+
+@cache_listing('index')
 def index(request):
-    posts = Post.objects.all()
-    page_obj = paginator(posts, request)
+    if sharding.get_shards():
+        page_obj = shard_paginator(
+            sharding.scatter(Post.objects.for_shard_cards()), request,
+        )
+    else:
+        page_obj = paginator(Post.objects.for_cards(), request)
     context = {
         'page_obj': page_obj,
+        'trending_posts': trending_posts(),
+        'trending_groups': trending_groups(),
     }
     return render(request, 'index.html', context)
 
 
+@cache_listing('group', 'slug')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(posts, request)
+    if sharding.get_shards():
+        page_obj = shard_paginator(
+            sharding.scatter(group.posts.for_shard_cards()), request,
+        )
+    else:
+        page_obj = paginator(group.posts.for_cards(), request)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'trending_posts': trending_posts(group.pk),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_listing('profile', 'username')
 def profile(request, username):
-    profile = get_object_or_404(User, username=username)
-    posts = profile.posts.all()
-    page_obj = paginator(posts, request)
+    # счетчики для карточки профиля приходят тем же запросом
+    profile = get_object_or_404(
+        User.objects.select_related('stats'), username=username,
+    )
+    if sharding.get_shards():
+        # все посты автора - в одном шарде, см. ShardRouter
+        page_obj = paginator(profile.posts.for_shard_cards(), request)
+        sharding.attach_related(page_obj.object_list)
+    else:
+        page_obj = paginator(profile.posts.for_cards(), request)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
     ).filter(
@@ -49,25 +134,92 @@ def profile(request, username):
     context = {
         'profile': profile,
         'page_obj': page_obj,
-        'posts': posts,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+def recommendations(request):
+    """
+    Блок «На кого подписаться» для страницы профиля. Профиль кэшируется
+    до изменения его владельца, а рекомендации меняются с подписками
+    зрителя и пересчетом, поэтому блок подгружается отдельно.
+    """
+    context = {
+        'recommendations': who_to_follow(request.user),
+    }
+    return render(
+        request, 'posts/includes/recommendations.html', context,
+    )
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(query, Post.objects.for_cards())
+    # поиск можно ограничить группой и автором
+    group = request.GET.get('group')
+    if group:
+        posts = posts.filter(group__slug=group)
+    author = request.GET.get('author')
+    if author:
+        posts = posts.filter(author__username=author)
+    page_obj = paginator(posts, request, SearchPaginator)
+
+    # ссылки пагинатора сохраняют запрос
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('after', None)
+    context = {
+        'query': query,
+        'scope_group': group,
+        'scope_author': author,
+        'page_obj': page_obj,
+        'page_query': f'{params.urlencode()}&' if params else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@condition(post_etag, post_last_modified)
 def post_detail(request, post_id):
-    # комментарии берутся в самом шаблоне post.comments.all
-    post = get_object_or_404(Post, id=post_id)
+    if sharding.get_shards():
+        post = get_post_or_404(Post.objects.all(), post_id)
+        sharding.attach_related([post])
+    else:
+        post = get_post_or_404(
+            Post.objects.select_related('author', 'group'), post_id,
+        )
+    attach_thumbnails([post])
+    # сразу выводятся только новые комментарии, остальные
+    # подгружаются порциями через post_comments
+    comments, comments_cursor = get_comment_page(post)
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'form': form,
         'available_for_comment': True,
+        'comments': comments,
+        'comments_cursor': comments_cursor,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев - фрагмент страницы поста."""
+    post = get_post_or_404(Post.objects.only('pk'), post_id)
+    comments, comments_cursor = get_comment_page(
+        post, request.GET.get('after'),
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+        'comments_cursor': comments_cursor,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
+@ratelimit('posts:post_create', user='5/m', ip='20/m')
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -88,7 +240,7 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_post_or_404(Post.objects.all(), post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post.pk)
 
@@ -111,8 +263,9 @@ def post_edit(request, post_id):
 
 
 @login_required
+@ratelimit('posts:add_comment', user='10/m', ip='60/m')
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_post_or_404(Post.objects.all(), post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -126,10 +279,20 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     # будут выведены посты авторов, на которых подписан текущий пользователь
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(posts, request)
+    if sharding.get_shards():
+        author_ids = Follow.objects.filter(
+            user=request.user,
+        ).values_list('author_id', flat=True)
+        page_obj = shard_paginator(
+            sharding.followed(Post.objects.for_shard_cards(), author_ids),
+            request,
+        )
+    else:
+        posts = Post.objects.for_cards().in_timeline(request.user)
+        page_obj = paginator(posts, request)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'recommendations': who_to_follow(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -24,12 +25,17 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'posts.apps.PostsConfig',
     'about',
+    'api',
     'users.apps.UsersConfig',
     'core',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    # первым, чтобы время запроса включало остальные middleware
+    'core.middleware.MetricsMiddleware',
+    # до остальных middleware: сессия тоже читается с реплики
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,7 +51,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с учетом времени отрисовки в метриках
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,13 +70,44 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
+# SQLite в режиме WAL (core/backends/sqlite3/base.py). Соединение
+# живет CONN_MAX_AGE секунд и проверяется в начале каждого запроса
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплики только для чтения (core/routers.py). Для проверки на одной
+# машине реплика - копия базы в файле YATUBE_REPLICA, которую
+# обновляет python manage.py sync_replicas --interval 1
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter', 'core.routers.ReplicaRouter',
+]
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.environ['YATUBE_REPLICA'],
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # запись в реплику - ошибка маршрутизации, а не расхождение
+        'OPTIONS': {'pragmas': {'query_only': 1}},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+# Сколько секунд после записи пользователь читает основную базу.
+# Должно быть больше отставания реплик
+REPLICA_STICKY_SECONDS = 5
+# Шарды постов и комментариев (posts/sharding.py) - псевдонимы
+# DATABASES с 'OPTIONS': {'pragmas': {'foreign_keys': 0}}. Пустой
+# список - все посты в основной базе. Шард готовит
+# python manage.py migrate --database <псевдоним>
+POST_SHARDS = []
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,8 +156,59 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш в файле SQLite общий для всех воркеров на сервере; путь к файлу -
+# в переменной окружения YATUBE_CACHE. Вместо него можно подключить
+# memcached:
+#     'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+#     'LOCATION': '127.0.0.1:11211',
+# Тесты работают со своим кэшем во временной папке (core/test_runner.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE',
+            os.path.join(tempfile.gettempdir(), 'yatube_cache.sqlite3'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
+
+TEST_RUNNER = 'core.test_runner.Runner'
+
+# Сколько последних постов хранится в материализованной ленте подписок;
+# ленты обрезает python manage.py trim_timelines, запускаемая по cron
+TIMELINE_MAX_LENGTH = 1000
+
+# Время жизни закэшированных списков постов. Списки сбрасываются
+# при изменениях, поэтому время жизни может быть большим
+LISTING_CACHE_TIMEOUT = 60 * 60
+
+# Миниатюры создаются в фоне пулом из THUMBNAIL_WORKERS процессов,
+# пока миниатюры нет, шаблоны показывают заглушку. При 0 миниатюра
+# создается сразу в том же процессе
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+# хранилище sorl с пакетным чтением миниатюр для страниц списков
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+
+# Загруженные картинки уменьшаются до IMAGE_MAX_SIZE точек по длинной
+# стороне и пересохраняются с качеством IMAGE_QUALITY
+IMAGE_MAX_SIZE = 2048
+IMAGE_QUALITY = 85
+# Картинки больше стольких точек (кроме JPEG, который декодируется
+# уменьшенным) отклоняются: RGBA на 50 Мп - это 200 Мб памяти
+IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+
+# Ограничение частоты записей (core/ratelimit.py). Лимиты заданы
+# в декораторах view и переопределяются здесь по имени URL:
+#     {'posts:post_create': {'user': '5/m', 'ip': '20/m'}}
+RATELIMIT_ENABLED = True
+RATELIMITS = {}
+
+# Метрики запросов (core/metrics.py) отдаются по /metrics сотрудникам
+# и запросам с заголовком Authorization: Bearer <METRICS_TOKEN>
+METRICS_ENABLED = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
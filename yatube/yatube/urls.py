@@ -3,6 +3,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics
+
 urlpatterns = [
     # регистрация и авторизация
     path('auth/', include('users.urls', namespace='users')),
@@ -15,6 +17,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
 
     path('about/', include('about.urls', namespace='about')),
+    # JSON API для чтения лент
+    path('api/v1/', include('api.urls', namespace='api')),
+    # метрики для Prometheus
+    path('metrics', metrics, name='metrics'),
     # обработчик для главной страницы ищем в urls.py приложения posts
     path("", include('posts.urls')),
 ]